@@ -0,0 +1,581 @@
+"""
+Columnar analytics snapshot for the report queries
+
+The sales, product and customer reports are scans over CYEAE_ORDERS and
+CYEAE_ORDER_ITEMS. AnalyticsSnapshot keeps a column-per-file copy of the
+fields those reports need (fixed-width array-module buffers, read back
+through mmap), plus in-memory group-by aggregates built from them, and
+answers the three reports without touching the order tables.
+
+Refreshing is incremental: rows with ORDER_ID above the stored watermark are
+read in one short read transaction on a dedicated connection (a primary-key
+range scan), appended to the column files and folded into the aggregates.
+Orders are append-only in normal operation; any UPDATE or DELETE of existing
+orders or items bumps CYEAE_ORDER_CHANGE_VERSION (migration 5), and the
+snapshot is then rebuilt from scratch. Cancelled orders are left out.
+Cancelling an order already in the snapshot is applied incrementally:
+refresh reads new 'cancelled' rows of CYEAE_ORDER_STATUS_HISTORY, copies the
+order and its items into the cancelled/cancelled_items column files and
+subtracts them from the aggregates.
+
+The files can be shared by several worker processes: writers take an flock
+on the directory, and a process that finds rows appended by another one
+folds them in from the files instead of querying SQLite again.
+"""
+
+import array
+import json
+import math
+import mmap
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, one worker only
+    fcntl = None
+
+FORMAT_VERSION = 3
+
+# table -> ((column, array typecode), ...)
+COLUMNS = {
+    'orders': (('order_id', 'q'), ('customer_id', 'q'), ('ts', 'q'), ('payment', 'i'), ('total', 'd')),
+    'items': (('order_id', 'q'), ('product_id', 'q'), ('quantity', 'q'), ('line_amount', 'd')),
+    # Cancelled orders, subtracted again. last_ts is the customer's latest
+    # remaining order; orders_rows the number of order rows folded before it.
+    'cancelled': (('order_id', 'q'), ('customer_id', 'q'), ('ts', 'q'), ('total', 'd'), ('last_ts', 'q'),
+                  ('orders_rows', 'q')),
+    'cancelled_items': (('order_id', 'q'), ('product_id', 'q'), ('quantity', 'q'), ('line_amount', 'd')),
+}
+
+NULL_ID = -1
+NULL_TS = -(2 ** 63)
+NAN = float('nan')
+
+# Cancelled orders are left out; orders cancelled after they were read are subtracted later
+ORDERS_SQL = """
+    SELECT ORDER_ID, CUSTOMER_ID, CAST(strftime('%s', ORDER_DATE) AS INTEGER),
+           COALESCE(PAYMENT_METHOD, ''), TOTAL_AMOUNT
+    FROM CYEAE_ORDERS
+    WHERE ORDER_ID > ? AND ORDER_ID <= ? AND STATUS IS NOT 'cancelled'
+    ORDER BY ORDER_ID
+"""
+ITEMS_SQL = """
+    SELECT oi.ORDER_ID, oi.PRODUCT_ID, oi.QUANTITY, oi.LINE_AMOUNT
+    FROM CYEAE_ORDER_ITEMS oi
+    LEFT JOIN CYEAE_ORDERS o ON o.ORDER_ID = oi.ORDER_ID
+    WHERE oi.ORDER_ID > ? AND oi.ORDER_ID <= ? AND o.STATUS IS NOT 'cancelled'
+    ORDER BY oi.ORDER_ID, oi.PRODUCT_ID
+"""
+CANCELLED_SQL = """
+    SELECT HISTORY_ID, ORDER_ID FROM CYEAE_ORDER_STATUS_HISTORY
+    WHERE HISTORY_ID > ? AND HISTORY_ID <= ? AND STATUS = 'cancelled'
+    ORDER BY HISTORY_ID
+"""
+
+
+def _format_ts(ts):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(ts))
+
+
+def _money(value):
+    """A stored amount as SQLite returns it: DECIMAL columns keep whole amounts as INTEGER.
+
+    Summing them as int keeps SUM() results integers until a fractional
+    amount is added, as in SQL, so the reports do not change type.
+    """
+    return int(value) if value.is_integer() else value
+
+
+def _day_number(value):
+    return date.fromisoformat(str(value)[:10]).toordinal()
+
+
+class AnalyticsSnapshot:
+    def __init__(self, db, directory='analytics', refresh_interval=2.0, fetch_size=10000):
+        self.db = db
+        self.directory = directory
+        self.refresh_interval = refresh_interval
+        self.fetch_size = fetch_size
+        self._lock = threading.RLock()
+        self._conn = None
+        self._meta = None
+        self._refreshed_at = None
+        self._stats = {'refreshes': 0, 'rebuilds': 0, 'rows_from_db': 0, 'rows_from_files': 0,
+                       'cancellations': 0, 'refresh_time_total': 0.0}
+        self._reset_aggregates()
+        os.makedirs(directory, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Reports (same row shapes as the CoffeeShopDB SQL versions)
+    # ------------------------------------------------------------------
+
+    def get_sales_report(self, start_date=None, end_date=None):
+        """Raises ValueError for a date that does not start with YYYY-MM-DD."""
+        lo = _day_number(start_date) if start_date else None
+        hi = _day_number(end_date) if end_date else None
+        self.refresh()
+        with self._lock:
+            days = [(day, list(agg)) for day, agg in self._days.items()
+                    if (lo is None or day >= lo) and (hi is None or day <= hi)]
+        days.sort(reverse=True)
+        rows = []
+        for day, (order_count, amount_count, total) in days:
+            if order_count <= 0:
+                continue
+            has_amount = amount_count > 0
+            rows.append((
+                date.fromordinal(day).isoformat(),
+                order_count,
+                total if has_amount else None,
+                total / amount_count if has_amount else None,
+            ))
+        return rows
+
+    def get_product_sales_report(self):
+        self.refresh()
+        with self._lock:
+            products = {pid: list(agg) for pid, agg in self._products.items()}
+        with self.db.db_manager.connection() as conn:
+            names = conn.execute("""
+                SELECT p.PRODUCT_ID, p.NAME, c.CATEGORY_NAME
+                FROM CYEAE_PRODUCT p
+                JOIN CYEAE_CATEGORY c ON p.CATEGORY_ID = c.CATEGORY_ID
+            """).fetchall()
+        rows = []
+        for product_id, name, category in names:
+            agg = products.get(product_id)
+            if agg is None or agg[3] <= 0:
+                continue
+            quantity, revenue, revenue_count, order_count = agg
+            rows.append((name, category, quantity, revenue if revenue_count else None, order_count))
+        rows.sort(key=lambda row: row[3] if row[3] is not None else -math.inf, reverse=True)
+        return rows
+
+    def get_customer_report(self):
+        self.refresh()
+        with self._lock:
+            customers = {cid: list(agg) for cid, agg in self._customers.items()}
+        with self.db.db_manager.connection() as conn:
+            people = conn.execute("SELECT CUSTOMER_ID, NAME, CUSTOMER_TYPE FROM CYEAE_CUSTOMER").fetchall()
+        rows = []
+        for customer_id, name, customer_type in people:
+            order_count, amount_count, total, last_ts = customers.get(customer_id, (0, 0, 0, NULL_TS))
+            has_amount = amount_count > 0
+            rows.append((
+                name,
+                customer_type,
+                order_count,
+                total if has_amount else None,
+                total / amount_count if has_amount else None,
+                _format_ts(last_ts) if last_ts != NULL_TS else None,
+            ))
+        # ORDER BY total_spent DESC: customers without a total sort last, as in SQLite
+        rows.sort(key=lambda row: row[3] if row[3] is not None else -math.inf, reverse=True)
+        return rows
+
+    # ------------------------------------------------------------------
+    # Refresh
+    # ------------------------------------------------------------------
+
+    def refresh(self, force=False):
+        """Bring the snapshot up to date; skipped if refreshed within refresh_interval seconds."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._refreshed_at is not None and now - self._refreshed_at < self.refresh_interval:
+                return
+            started = time.perf_counter()
+            with self._file_lock():
+                self._refresh()
+            self._refreshed_at = time.monotonic()
+            self._stats['refreshes'] += 1
+            self._stats['refresh_time_total'] += time.perf_counter() - started
+
+    def rebuild(self):
+        """Discard the column files and rebuild everything from the database."""
+        with self._lock, self._file_lock():
+            meta = self._read_meta()
+            if meta is not None:
+                meta['change_version'] = None
+                self._write_meta(meta)
+            self._refresh()
+            self._refreshed_at = time.monotonic()
+
+    def _refresh(self):
+        if self._conn is None:
+            self._conn = self.db.db_manager.get_connection()
+        conn = self._conn
+        # One read transaction: the watermark, change version and fetched rows are consistent
+        conn.execute("BEGIN")
+        try:
+            self._refresh_in_transaction(conn)
+        except BaseException:
+            # The aggregates may now be ahead of the files; reload them next time
+            self._meta = None
+            raise
+        finally:
+            conn.rollback()
+
+    def _refresh_in_transaction(self, conn):
+        change_version = conn.execute(
+            "SELECT VERSION FROM CYEAE_ORDER_CHANGE_VERSION WHERE ID = 1"
+        ).fetchone()[0]
+        high = conn.execute("SELECT COALESCE(MAX(ORDER_ID), 0) FROM CYEAE_ORDERS").fetchone()[0]
+        history_high = conn.execute(
+            "SELECT COALESCE(MAX(HISTORY_ID), 0) FROM CYEAE_ORDER_STATUS_HISTORY"
+        ).fetchone()[0]
+
+        meta = self._read_meta()
+        if (meta is None or meta['change_version'] != change_version or meta['watermark'] > high
+                or meta['db_path'] != os.path.abspath(self.db.db_manager.db_path)):
+            meta = self._new_meta(time.time_ns(), change_version)
+            # Orders read from now on skip the ones cancelled so far
+            meta['history_watermark'] = history_high
+            self._truncate_columns(meta)
+            self._write_meta(meta)
+            self._stats['rebuilds'] += 1
+
+        # Catch up with the files first (written by an earlier run or another worker)
+        if self._meta is None or self._meta['generation'] != meta['generation']:
+            self._reset_aggregates()
+            self._meta = self._new_meta(meta['generation'], meta['change_version'])
+        self._catch_up(self._meta['rows'], meta['rows'])
+        self._meta = meta
+
+        low = meta['watermark']
+        if high > low or history_high > meta['history_watermark']:
+            self._append_from_db(conn, meta, high)
+            meta['watermark'] = high
+            self._append_cancellations(conn, meta, low, history_high)
+            meta['history_watermark'] = history_high
+            self._write_meta(meta)
+        self._meta = json.loads(json.dumps(meta))
+
+    def _catch_up(self, folded, rows):
+        """Fold the file rows between the counts folded and rows.
+
+        Sums do not depend on the order they are folded in, but a customer's
+        last order time does: each cancellation is applied right after the
+        order rows that were folded before it when it was written.
+        """
+        for table in ('items', 'cancelled_items'):
+            self._fold_from_files_counted(table, folded[table], rows[table])
+        position = folded['orders']
+        start, stop = folded['cancelled'], rows['cancelled']
+        if stop > start:
+            with self._mapped_columns('cancelled', start, stop) as columns:
+                for i in range(stop - start):
+                    record = [column[i] for column in columns]
+                    self._fold_from_files_counted('orders', position, record[5])
+                    position = max(position, record[5])
+                    self._unfold_orders(*([value] for value in record[:5]))
+            self._stats['rows_from_files'] += stop - start
+        self._fold_from_files_counted('orders', position, rows['orders'])
+
+    def _fold_from_files_counted(self, table, start, stop):
+        if stop > start:
+            self._fold_from_files(table, start, stop)
+            self._stats['rows_from_files'] += stop - start
+
+    def _append_from_db(self, conn, meta, high):
+        low = meta['watermark']
+        payment_codes = {name: code for code, name in enumerate(meta['payments'])}
+        for table, sql in (('orders', ORDERS_SQL), ('items', ITEMS_SQL)):
+            self._truncate_columns(meta, table)
+            cursor = conn.execute(sql, (low, high))
+            while True:
+                batch = cursor.fetchmany(self.fetch_size)
+                if not batch:
+                    break
+                if table == 'orders':
+                    columns = self._order_columns(batch, payment_codes, meta['payments'])
+                else:
+                    columns = self._item_columns(batch)
+                self._append_columns(table, columns)
+                meta['rows'][table] += len(batch)
+                self._stats['rows_from_db'] += len(batch)
+                self._fold(table, columns)
+
+    def _append_cancellations(self, conn, meta, low, history_high):
+        """Subtract orders up to ORDER_ID low that were cancelled since the history watermark.
+
+        Orders above low were read after they were cancelled, so never counted.
+        """
+        order_ids = [order_id for _, order_id in
+                     conn.execute(CANCELLED_SQL, (meta['history_watermark'], history_high)).fetchall()
+                     if order_id <= low]
+        order_ids = list(dict.fromkeys(order_ids))
+        if not order_ids:
+            return
+        cancelled = tuple(array.array(code) for _, code in COLUMNS['cancelled'])
+        item_batch = []
+        for i in range(0, len(order_ids), 500):
+            chunk = order_ids[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            orders = conn.execute(f"""
+                SELECT ORDER_ID, CUSTOMER_ID, CAST(strftime('%s', ORDER_DATE) AS INTEGER), TOTAL_AMOUNT
+                FROM CYEAE_ORDERS WHERE ORDER_ID IN ({placeholders})
+            """, chunk).fetchall()
+            by_id = {row[0]: row for row in orders}
+            for order_id in chunk:
+                row = by_id.get(order_id)
+                if row is None:
+                    continue
+                last_ts = None
+                if row[1] is not None:
+                    last_ts = conn.execute("""
+                        SELECT CAST(strftime('%s', MAX(ORDER_DATE)) AS INTEGER) FROM CYEAE_ORDERS
+                        WHERE CUSTOMER_ID = ? AND ORDER_ID <= ? AND STATUS IS NOT 'cancelled'
+                    """, (row[1], meta['watermark'])).fetchone()[0]
+                values = (order_id, row[1] if row[1] is not None else NULL_ID,
+                          row[2] if row[2] is not None else NULL_TS,
+                          float(row[3]) if row[3] is not None else NAN,
+                          last_ts if last_ts is not None else NULL_TS, meta['rows']['orders'])
+                for column, value in zip(cancelled, values):
+                    column.append(value)
+            item_batch += conn.execute(f"""
+                SELECT ORDER_ID, PRODUCT_ID, QUANTITY, LINE_AMOUNT FROM CYEAE_ORDER_ITEMS
+                WHERE ORDER_ID IN ({placeholders})
+                ORDER BY ORDER_ID, PRODUCT_ID
+            """, chunk).fetchall()
+        items = self._item_columns(item_batch)
+        for table, columns in (('cancelled', cancelled), ('cancelled_items', items)):
+            self._truncate_columns(meta, table)
+            self._append_columns(table, columns)
+            meta['rows'][table] += len(columns[0])
+            self._fold(table, columns)
+        self._stats['cancellations'] += len(cancelled[0])
+
+    def _order_columns(self, batch, payment_codes, payments):
+        order_id, customer_id, ts, payment, total = (array.array(code) for _, code in COLUMNS['orders'])
+        for row in batch:
+            order_id.append(row[0])
+            customer_id.append(row[1] if row[1] is not None else NULL_ID)
+            ts.append(row[2] if row[2] is not None else NULL_TS)
+            code = payment_codes.get(row[3])
+            if code is None:
+                code = payment_codes[row[3]] = len(payments)
+                payments.append(row[3])
+            payment.append(code)
+            total.append(float(row[4]) if row[4] is not None else NAN)
+        return order_id, customer_id, ts, payment, total
+
+    def _item_columns(self, batch):
+        order_id, product_id, quantity, line_amount = (array.array(code) for _, code in COLUMNS['items'])
+        for row in batch:
+            order_id.append(row[0] if row[0] is not None else NULL_ID)
+            product_id.append(row[1] if row[1] is not None else NULL_ID)
+            quantity.append(row[2] or 0)
+            line_amount.append(float(row[3]) if row[3] is not None else NAN)
+        return order_id, product_id, quantity, line_amount
+
+    # ------------------------------------------------------------------
+    # Group-by
+    # ------------------------------------------------------------------
+
+    def _reset_aggregates(self):
+        self._days = {}        # day ordinal -> [order_count, amount_count, total_sales]
+        self._products = {}    # PRODUCT_ID -> [quantity, revenue, revenue_count, order_count]
+        self._customers = {}   # CUSTOMER_ID -> [order_count, amount_count, total_spent, last_ts]
+        self._last_item = None  # (ORDER_ID, PRODUCT_ID) of the last folded item, for COUNT(DISTINCT)
+
+    def _fold(self, table, columns):
+        if table == 'orders':
+            self._fold_orders(*columns)
+        elif table == 'items':
+            self._fold_items(*columns)
+        elif table == 'cancelled':
+            self._unfold_orders(*columns[:5])
+        else:
+            self._unfold_items(*columns)
+
+    def _fold_orders(self, order_ids, customer_ids, tss, payments, totals):
+        days = self._days
+        customers = self._customers
+        epoch = date(1970, 1, 1).toordinal()
+        for customer_id, ts, total in zip(customer_ids, tss, totals):
+            has_amount = total == total  # NaN marks a NULL TOTAL_AMOUNT
+            if ts != NULL_TS:
+                agg = days.get(ts // 86400 + epoch)
+                if agg is None:
+                    agg = days[ts // 86400 + epoch] = [0, 0, 0]
+                agg[0] += 1
+                if has_amount:
+                    agg[1] += 1
+                    agg[2] += _money(total)
+            if customer_id != NULL_ID:
+                agg = customers.get(customer_id)
+                if agg is None:
+                    agg = customers[customer_id] = [0, 0, 0, NULL_TS]
+                agg[0] += 1
+                if has_amount:
+                    agg[1] += 1
+                    agg[2] += _money(total)
+                if ts > agg[3]:
+                    agg[3] = ts
+
+    def _unfold_orders(self, order_ids, customer_ids, tss, totals, last_tss):
+        days = self._days
+        customers = self._customers
+        epoch = date(1970, 1, 1).toordinal()
+        for customer_id, ts, total, last_ts in zip(customer_ids, tss, totals, last_tss):
+            has_amount = total == total
+            if ts != NULL_TS:
+                agg = days[ts // 86400 + epoch]
+                agg[0] -= 1
+                if has_amount:
+                    agg[1] -= 1
+                    agg[2] -= _money(total)
+            if customer_id != NULL_ID:
+                agg = customers[customer_id]
+                agg[0] -= 1
+                if has_amount:
+                    agg[1] -= 1
+                    agg[2] -= _money(total)
+                if agg[3] == ts:
+                    agg[3] = last_ts
+
+    def _unfold_items(self, order_ids, product_ids, quantities, line_amounts):
+        products = self._products
+        last = None
+        for order_id, product_id, quantity, line_amount in zip(order_ids, product_ids, quantities, line_amounts):
+            agg = products[product_id]
+            agg[0] -= quantity
+            if line_amount == line_amount:
+                agg[1] -= _money(line_amount)
+                agg[2] -= 1
+            if (order_id, product_id) != last:
+                agg[3] -= 1
+                last = (order_id, product_id)
+
+    def _fold_items(self, order_ids, product_ids, quantities, line_amounts):
+        products = self._products
+        last = self._last_item
+        for key in zip(order_ids, product_ids, quantities, line_amounts):
+            order_id, product_id, quantity, line_amount = key
+            agg = products.get(product_id)
+            if agg is None:
+                agg = products[product_id] = [0, 0, 0, 0]
+            agg[0] += quantity
+            if line_amount == line_amount:
+                agg[1] += _money(line_amount)
+                agg[2] += 1
+            # Items arrive ordered by (ORDER_ID, PRODUCT_ID), so repeats are adjacent
+            if (order_id, product_id) != last:
+                agg[3] += 1
+                last = (order_id, product_id)
+        self._last_item = last
+
+    # ------------------------------------------------------------------
+    # Column files
+    # ------------------------------------------------------------------
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _column_path(self, table, column):
+        return self._path(f"{table}.{column}.bin")
+
+    def _new_meta(self, generation, change_version):
+        return {
+            'format': FORMAT_VERSION,
+            'db_path': os.path.abspath(self.db.db_manager.db_path),
+            'generation': generation,
+            'change_version': change_version,
+            'watermark': 0,
+            'history_watermark': 0,
+            'rows': {table: 0 for table in COLUMNS},
+            'payments': [],
+        }
+
+    def _read_meta(self):
+        try:
+            with open(self._path('meta.json')) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get('format') == FORMAT_VERSION else None
+
+    def _write_meta(self, meta):
+        path = self._path('meta.json')
+        if meta is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, path)
+
+    def _truncate_columns(self, meta, table=None):
+        """Cut column files back to the committed row counts (drops rows from an interrupted append)."""
+        for name in ([table] if table else COLUMNS):
+            for column, code in COLUMNS[name]:
+                path = self._column_path(name, column)
+                size = meta['rows'][name] * array.array(code).itemsize
+                with open(path, 'ab') as f:
+                    if f.tell() != size:
+                        f.truncate(size)
+
+    def _append_columns(self, table, columns):
+        for (column, _), values in zip(COLUMNS[table], columns):
+            with open(self._column_path(table, column), 'ab') as f:
+                values.tofile(f)
+
+    def _fold_from_files(self, table, start, stop):
+        with self._mapped_columns(table, start, stop) as columns:
+            for offset in range(0, stop - start, self.fetch_size):
+                self._fold(table, [column[offset:offset + self.fetch_size] for column in columns])
+
+    @contextmanager
+    def _mapped_columns(self, table, start, stop):
+        """memoryviews over rows [start, stop) of each column file of table."""
+        files, maps, views = [], [], []
+        try:
+            for column, code in COLUMNS[table]:
+                itemsize = array.array(code).itemsize
+                f = open(self._column_path(table, column), 'rb')
+                files.append(f)
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                maps.append(m)
+                views.append(memoryview(m)[start * itemsize:stop * itemsize].cast(code))
+            yield views
+        finally:
+            for view in views:
+                view.release()
+            for m in maps:
+                m.close()
+            for f in files:
+                f.close()
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self._path('.lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # ------------------------------------------------------------------
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            meta = self._meta or {}
+            stats['watermark'] = meta.get('watermark', 0)
+            stats['rows'] = dict(meta.get('rows', {}))
+            stats['generation'] = meta.get('generation', 0)
+        return stats
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -1,15 +1,73 @@
-from flask import Flask, request, jsonify, render_template, redirect, url_for, session, send_from_directory
+from flask import Flask, Response, abort, request, jsonify, render_template, redirect, url_for, session, send_file, send_from_directory, stream_with_context
 import os
 from flask_cors import CORS
-from database import CoffeeShopDB
+from credentials import PasswordHasher
+from database import CoffeeShopDB, CustomerExists, InvalidStatusTransition, OrderValidationError, OutOfStock
+from kitchen_queue import OPEN_STATUSES
+from sessions import MemorySessionStore, SQLiteSessionStore, ServerSideSessionInterface, start_sweeper
+from order_writer import OrderWriter, WriterBusy
+import customers
+import export_orders
+import json_rows
+import order_feed
+import sales_buckets
+import static_assets
 import json
+import mimetypes
+import secrets
 from datetime import datetime
 
 app = Flask(__name__)
-app.secret_key = 'change-this-secret'  # for session
+app.secret_key = os.environ.get('SECRET_KEY') or secrets.token_hex(32)
 CORS(app)
 
-db = CoffeeShopDB()
+# 会话数据保存在服务端, cookie 只携带随机会话 ID
+SESSION_TTL = int(os.environ.get('SESSION_TTL', 8 * 3600))
+if os.environ.get('SESSION_STORE', 'memory') == 'sqlite':
+    session_store = SQLiteSessionStore(os.environ.get('SESSION_DB_PATH', 'sessions.db'), ttl=SESSION_TTL)
+else:
+    session_store = MemorySessionStore(ttl=SESSION_TTL, max_size=int(os.environ.get('SESSION_MAX', 10000)))
+app.session_interface = ServerSideSessionInterface(session_store)
+start_sweeper(session_store, interval=int(os.environ.get('SESSION_SWEEP_INTERVAL', 60)))
+
+db = CoffeeShopDB(
+    os.environ.get('COFFEE_DB_PATH', 'coffee_shop.db'),
+    pool_size=int(os.environ.get('DB_POOL_SIZE', 8)),
+    slow_query_ms=float(os.environ.get('SLOW_QUERY_MS', 200)),
+    hasher=PasswordHasher(
+        algorithm=os.environ.get('PASSWORD_HASHER', 'scrypt'),
+        workers=int(os.environ.get('KDF_WORKERS', 2))
+    ),
+    # Set ANALYTICS_DIR= (empty) to answer reports with SQL instead of the snapshot
+    analytics_dir=os.environ.get('ANALYTICS_DIR', 'analytics'),
+    # Set REPLICA_DB_PATH to serve reports, order lists and exports from a read replica
+    replica_path=os.environ.get('REPLICA_DB_PATH') or None,
+    replica_interval=float(os.environ.get('REPLICA_INTERVAL', 10)),
+    replica_max_lag=float(os.environ.get('REPLICA_MAX_LAG', 60))
+)
+# 所有 POST /api/orders 写入都经由单一写线程, 按组提交
+order_writer = OrderWriter(
+    db,
+    max_queue=int(os.environ.get('ORDER_QUEUE_SIZE', 1000)),
+    max_batch=int(os.environ.get('ORDER_BATCH_SIZE', 64))
+)
+ORDER_WRITE_TIMEOUT = float(os.environ.get('ORDER_WRITE_TIMEOUT', 30))
+
+# 静态资源: 带内容哈希的文件名, 预压缩的 CSS/JS, 缩放后的产品图片
+# STATIC_ASSETS=build (default) builds at startup, =prebuilt uses the output
+# of `python manage.py build-assets`, =off serves the plain static files
+assets = static_assets.StaticAssets(app.static_folder)
+if os.environ.get('STATIC_ASSETS', 'build') == 'build':
+    assets.build()
+elif os.environ.get('STATIC_ASSETS') == 'prebuilt':
+    assets.load()
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+@app.context_processor
+def asset_helpers():
+    def asset_url(name):
+        return assets.url(name) or url_for('static', filename=name)
+    return {'asset_url': asset_url, 'asset_images': assets.images}
 
 @app.route('/')
 def index():
@@ -29,6 +87,7 @@ def admin_login():
     username = data.get('username')
     password = data.get('password')
     if username == 'admin' and password == 'admin123':
+        session.regenerate()
         session['admin_logged_in'] = True
         return redirect(url_for('admin'))
     return render_template('admin_login.html', error='Invalid credentials'), 401
@@ -39,35 +98,73 @@ def admin_logout():
     return redirect(url_for('admin_login'))
 
 
+def cached_json_response(body, etag):
+    """Serve pre-serialized JSON with an ETag; answers If-None-Match with 304."""
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'public, no-cache'
+    return response.make_conditional(request)
+
+def rows_response(serializer, rows, **fields):
+    """{"success": true, "data": [...rows as objects...], **fields} without building dicts."""
+    return Response(json_rows.envelope(serializer.encode(rows), **fields), mimetype='application/json')
+
 @app.route('/api/products', methods=['GET'])
 def get_products():
     try:
-        products = db.get_all_products()
-        product_list = []
-        for product in products:
-            product_list.append({
-                'id': product[0],
-                'name': product[1],
-                'price': float(product[2]),
-                'is_active': product[3],
-                'category': product[4]
-            })
-        return jsonify({'success': True, 'data': product_list})
+        body, etag = db.get_products_payload()
+        return cached_json_response(body, etag)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/categories', methods=['GET'])
 def get_categories():
     try:
-        categories = db.get_categories()
-        category_list = []
-        for category in categories:
-            category_list.append({
-                'id': category[0],
-                'name': category[1],
-                'description': category[2]
-            })
-        return jsonify({'success': True, 'data': category_list})
+        body, etag = db.get_categories_payload()
+        return cached_json_response(body, etag)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+STOCK_ROWS = json_rows.RowSerializer('product_id', 'product_name', 'quantity', 'updated_at')
+
+@app.route('/api/stock', methods=['GET'])
+def get_stock():
+    try:
+        if not session.get('admin_logged_in'):
+            return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+        return rows_response(STOCK_ROWS, db.get_stock_levels())
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/products/<int:product_id>/stock', methods=['PUT'])
+def set_product_stock(product_id):
+    """设置库存数量; {"quantity": null} 取消限量"""
+    try:
+        if not session.get('admin_logged_in'):
+            return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+        data = request.get_json(silent=True) or {}
+        quantity = data.get('quantity')
+        if quantity is not None and (not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 0):
+            return jsonify({'success': False, 'error': 'quantity must be a non-negative integer or null'}), 400
+        if not db.set_stock(product_id, quantity):
+            return jsonify({'success': False, 'error': 'Product not found'}), 404
+        return jsonify({'success': True, 'product_id': product_id, 'quantity': quantity})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/products/<int:product_id>/stock/adjust', methods=['POST'])
+def adjust_product_stock(product_id):
+    """进货或报损: {"delta": 12} / {"delta": -2}"""
+    try:
+        if not session.get('admin_logged_in'):
+            return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+        delta = (request.get_json(silent=True) or {}).get('delta')
+        if not isinstance(delta, int) or isinstance(delta, bool):
+            return jsonify({'success': False, 'error': 'delta must be an integer'}), 400
+        quantity = db.adjust_stock(product_id, delta)
+        if quantity is None:
+            return jsonify({'success': False, 'error': 'Product has no stock count'}), 404
+        return jsonify({'success': True, 'product_id': product_id, 'quantity': quantity})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -100,22 +197,19 @@ def register():
 
         if not all([name, email, password]):
             return jsonify({'success': False, 'error': 'Missing required fields'}), 400
+        if customers.normalize_email(email) is None:
+            return jsonify({'success': False, 'error': 'Invalid email address'}), 400
 
-        # Create customer as member
-        customer_id = db.create_customer(
-            name=name,
-            phone=phone,
-            email=email,
-            address=address,
-            customer_type='member'
-        )
-        db.create_member_customer(customer_id, password, date_of_birth)
+        customer_id = db.register_member(name, email, password, phone=phone, address=address,
+                                         date_of_birth=date_of_birth)
 
         return jsonify({'success': True, 'data': {
             'customer_id': customer_id,
             'name': name,
             'email': email
         }})
+    except CustomerExists as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -131,75 +225,278 @@ def login():
         member = db.verify_member_login(email, password)
         if not member:
             return jsonify({'success': False, 'error': 'Invalid email or password'}), 401
+        session.regenerate()
+        session['member'] = member
         return jsonify({'success': True, 'data': member})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/auth/me', methods=['GET'])
+def current_member():
+    # Served from the session store; no database access
+    member = session.get('member')
+    if not member:
+        return jsonify({'success': False, 'error': 'Not signed in'}), 401
+    return jsonify({'success': True, 'data': member})
+
+@app.route('/api/auth/logout', methods=['POST'])
+def logout():
+    session.pop('member', None)
+    return jsonify({'success': True})
+
 @app.route('/api/orders', methods=['POST'])
 def create_order():
     try:
         data = request.get_json()
         
         customer_id = data.get('customer_id')
+        if not customer_id and session.get('member'):
+            # Signed-in member: bill the order to their own customer record
+            customer_id = session['member']['customer_id']
+        customer = None
         if not customer_id:
-            customer_id = db.create_customer(
-                name=data['customer_name'],
-                phone=data.get('customer_phone', ''),
-                email=data.get('customer_email', ''),
-                address=data.get('customer_address', '')
-            )
+            # Walk-in customer: created in the same transaction as the order
+            customer = {
+                'name': data['customer_name'],
+                'phone': data.get('customer_phone', ''),
+                'email': data.get('customer_email', ''),
+                'address': data.get('customer_address', '')
+            }
         
-        order_id = db.create_order(
+        order_id = order_writer.create_order(
             customer_id=customer_id,
             payment_method=data['payment_method'],
-            order_items=data['items']
+            order_items=data['items'],
+            customer=customer,
+            timeout=ORDER_WRITE_TIMEOUT
         )
         
         return jsonify({'success': True, 'order_id': order_id})
+    except OutOfStock as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    except OrderValidationError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except WriterBusy as e:
+        response = jsonify({'success': False, 'error': str(e)})
+        response.headers['Retry-After'] = '1'
+        return response, 503
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+MAX_BATCH_ORDERS = 2000
+
+@app.route('/api/orders/batch', methods=['POST'])
+def create_orders_batch():
+    try:
+        data = request.get_json(silent=True) or {}
+        orders = data.get('orders')
+        if not isinstance(orders, list) or not orders:
+            return jsonify({'success': False, 'error': 'Expected a non-empty "orders" list'}), 400
+        if len(orders) > MAX_BATCH_ORDERS:
+            return jsonify({'success': False, 'error': f'At most {MAX_BATCH_ORDERS} orders per batch'}), 413
+
+        results = db.create_orders_bulk(orders)
+        summary = {status: sum(1 for r in results if r['status'] == status)
+                   for status in ('created', 'duplicate', 'error')}
+        return jsonify({'success': True, 'summary': summary, 'results': results})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+ORDERS_PAGE_DEFAULT = 50
+ORDERS_PAGE_MAX = 500
+
+ORDER_ROWS = json_rows.RowSerializer(
+    'order_id', 'customer_name', 'order_date', 'status', 'payment_method', ('total_amount', float))
+ORDER_ITEM_ROWS = json_rows.RowSerializer(
+    'product_id', 'product_name', 'quantity', ('unit_price', float), ('line_amount', float))
+SALES_REPORT_ROWS = json_rows.RowSerializer(
+    'date', 'order_count', ('total_sales', json_rows.float_or_zero), ('avg_order_value', json_rows.float_or_zero))
+PRODUCT_REPORT_ROWS = json_rows.RowSerializer(
+    'product_name', 'category', 'total_quantity', ('total_revenue', json_rows.float_or_zero), 'order_count')
+CUSTOMER_REPORT_ROWS = json_rows.RowSerializer(
+    'customer_name', 'customer_type', ('order_count', json_rows.or_zero),
+    ('total_spent', json_rows.float_or_zero), ('avg_order_value', json_rows.float_or_zero), 'last_order_date')
+
+def orders_with_items(orders, items):
+    """ORDER_ROWS objects with their line items nested under 'items' (items: ORDER_ID -> item rows)."""
+    data = ORDER_ROWS.to_dicts(orders)
+    for order in data:
+        order['items'] = ORDER_ITEM_ROWS.to_dicts(items.get(order['order_id'], []))
+    return data
+
 @app.route('/api/orders', methods=['GET'])
 def get_orders():
+    """Order list, newest first; ?include=items nests every order's line items (one extra query per page)."""
     try:
         if not session.get('admin_logged_in'):
             return jsonify({'success': False, 'error': 'Unauthorized'}), 401
-        customer_id = request.args.get('customer_id')
-        orders = db.get_order_history(customer_id)
-        
-        order_list = []
-        for order in orders:
-            order_list.append({
-                'order_id': order[0],
-                'customer_name': order[1],
-                'order_date': order[2],
-                'status': order[3],
-                'payment_method': order[4],
-                'total_amount': float(order[5])
-            })
-        
-        return jsonify({'success': True, 'data': order_list})
+        try:
+            limit = min(max(int(request.args.get('limit', ORDERS_PAGE_DEFAULT)), 1), ORDERS_PAGE_MAX)
+            orders, next_cursor = db.get_orders_page(
+                limit=limit,
+                cursor=request.args.get('cursor'),
+                customer_id=request.args.get('customer_id'),
+                status=request.args.get('status'),
+                payment_method=request.args.get('payment_method'),
+                start_date=request.args.get('start_date'),
+                end_date=request.args.get('end_date')
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        if request.args.get('include') == 'items':
+            data = orders_with_items(orders, db.get_order_items([order[0] for order in orders]))
+            return Response(json_rows.envelope(json_rows.dumps(data), next_cursor=next_cursor),
+                            mimetype='application/json')
+        return rows_response(ORDER_ROWS, orders, next_cursor=next_cursor)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# 实时订单流: 新订单与状态变更以 Server-Sent Events 推送, 后台不再轮询整个订单列表
+ORDER_STREAM_KEEPALIVE = float(os.environ.get('ORDER_STREAM_KEEPALIVE', 15))
+ORDER_STREAM_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+# Sent first: how long the browser waits before reconnecting with Last-Event-ID
+ORDER_STREAM_RETRY = b'retry: 3000\n\n'
+
+@app.route('/api/orders/stream', methods=['GET'])
+def stream_orders():
+    """New orders (and status changes) as they happen. Under asgi.py this route is served natively.
+
+    Starts after ?last_event_id= (the newest ORDER_ID the page already shows),
+    or after the Last-Event-ID header when the browser reconnects.
+    """
+    if not session.get('admin_logged_in'):
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    last_event_id = order_feed.parse_last_event_id(
+        request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+    subscription = db.order_feed.subscribe(last_event_id)
+
+    def generate():
+        try:
+            yield ORDER_STREAM_RETRY
+            while not subscription.closed:
+                events = subscription.get(ORDER_STREAM_KEEPALIVE)
+                yield b''.join(map(order_feed.format_event, events)) if events else order_feed.KEEPALIVE
+            # Ended after a partial replay (or dropped): send what is left, the browser reconnects with Last-Event-ID
+            yield b''.join(map(order_feed.format_event, subscription.drain()))
+        finally:
+            db.order_feed.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream', headers=ORDER_STREAM_HEADERS)
+
+@app.route('/api/orders/export', methods=['GET'])
+def export_order_history():
+    if not session.get('admin_logged_in'):
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    fmt = request.args.get('format', 'csv')
+    if fmt not in export_orders.FORMATS:
+        return jsonify({'success': False, 'error': f'Unsupported export format: {fmt}'}), 400
+
+    chunks = export_orders.iter_export(
+        db, fmt,
+        start_date=request.args.get('start_date'),
+        end_date=request.args.get('end_date')
+    )
+    filename = f"orders_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    return Response(
+        stream_with_context(chunks),
+        mimetype=export_orders.FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
 @app.route('/api/orders/<int:order_id>/details', methods=['GET'])
 def get_order_details(order_id):
     try:
         if not session.get('admin_logged_in'):
             return jsonify({'success': False, 'error': 'Unauthorized'}), 401
         items = db.get_order_details(order_id)
-        
-        item_list = []
-        for item in items:
-            item_list.append({
-                'product_id': item[0],
-                'product_name': item[1],
-                'quantity': item[2],
-                'unit_price': float(item[3]),
-                'line_amount': float(item[4])
-            })
-        
-        return jsonify({'success': True, 'data': item_list})
+        return rows_response(ORDER_ITEM_ROWS, items)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/orders/details', methods=['GET'])
+def get_orders_details():
+    """Several orders with their line items in one call: ?ids=1,2,3 (at most ORDERS_PAGE_MAX)"""
+    try:
+        if not session.get('admin_logged_in'):
+            return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+        ids = [value for value in request.args.get('ids', '').split(',') if value.strip()]
+        if not ids or not all(value.strip().isdigit() for value in ids):
+            return jsonify({'success': False, 'error': 'Expected ids=<order_id>,<order_id>,...'}), 400
+        if len(ids) > ORDERS_PAGE_MAX:
+            return jsonify({'success': False, 'error': f'At most {ORDERS_PAGE_MAX} orders per call'}), 413
+
+        found = db.get_orders_with_items([int(value) for value in ids])
+        data = orders_with_items([order for order, _ in found], {order[0]: items for order, items in found})
+        return Response(json_rows.envelope(json_rows.dumps(data)), mimetype='application/json')
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+STATUS_HISTORY_ROWS = json_rows.RowSerializer('from_status', 'status', 'changed_at')
+
+@app.route('/api/orders/<int:order_id>/status', methods=['GET'])
+def get_order_status(order_id):
+    try:
+        if not session.get('admin_logged_in'):
+            return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+        return rows_response(STATUS_HISTORY_ROWS, db.get_order_status_history(order_id))
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/orders/<int:order_id>/status', methods=['PUT'])
+def update_order_status(order_id):
+    """订单状态流转: pending → preparing → ready → completed, 或 cancelled"""
+    try:
+        if not session.get('admin_logged_in'):
+            return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+        data = request.get_json(silent=True) or {}
+        changed = db.update_order_status(order_id, data.get('status'))
+        if changed is None:
+            return jsonify({'success': False, 'error': 'Order not found'}), 404
+        previous_status, changed_at = changed
+        return jsonify({'success': True, 'data': {
+            'order_id': order_id,
+            'status': data['status'],
+            'previous_status': previous_status,
+            'changed_at': changed_at
+        }})
+    except InvalidStatusTransition as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    except OrderValidationError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+KITCHEN_QUEUE_DEFAULT = 20
+KITCHEN_QUEUE_MAX = 100
+
+@app.route('/api/kitchen/queue', methods=['GET'])
+def get_kitchen_queue():
+    """Next open orders, oldest first, with their items: ?limit=20&status=pending,preparing"""
+    try:
+        if not session.get('admin_logged_in'):
+            return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+        try:
+            limit = min(max(int(request.args.get('limit', KITCHEN_QUEUE_DEFAULT)), 1), KITCHEN_QUEUE_MAX)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid limit'}), 400
+        statuses = tuple(filter(None, request.args.get('status', '').split(','))) or OPEN_STATUSES
+        unknown = [status for status in statuses if status not in OPEN_STATUSES]
+        if unknown:
+            return jsonify({'success': False, 'error': f"Not an open status: {', '.join(unknown)}"}), 400
+
+        queue = db.get_kitchen_queue(limit, statuses)
+        orders = orders_with_items([order for order, _ in queue], {order[0]: items for order, items in queue})
+        return jsonify({'success': True, 'data': orders, 'open': db.kitchen_queue.stats()['by_status']})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/dashboard/summary', methods=['GET'])
+def get_dashboard_summary():
+    try:
+        if not session.get('admin_logged_in'):
+            return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+        return jsonify({'success': True, 'data': db.get_dashboard_summary()})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -210,17 +507,23 @@ def get_sales_report():
         end_date = request.args.get('end_date')
         
         report = db.get_sales_report(start_date, end_date)
-        
-        report_data = []
-        for row in report:
-            report_data.append({
-                'date': row[0],
-                'order_count': row[1],
-                'total_sales': float(row[2]) if row[2] else 0,
-                'avg_order_value': float(row[3]) if row[3] else 0
-            })
-        
-        return jsonify({'success': True, 'data': report_data})
+        return rows_response(SALES_REPORT_ROWS, report)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/reports/sales/buckets', methods=['GET'])
+def get_sales_buckets():
+    try:
+        try:
+            columns, rows = db.get_sales_buckets(
+                bucket=request.args.get('bucket', 'day'),
+                start_date=request.args.get('start_date'),
+                end_date=request.args.get('end_date'),
+                group_by=sales_buckets.parse_group_by(request.args.get('group_by'))
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        return rows_response(json_rows.RowSerializer(*columns), rows, columns=columns)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -228,18 +531,7 @@ def get_sales_report():
 def get_product_sales_report():
     try:
         report = db.get_product_sales_report()
-        
-        report_data = []
-        for row in report:
-            report_data.append({
-                'product_name': row[0],
-                'category': row[1],
-                'total_quantity': row[2],
-                'total_revenue': float(row[3]) if row[3] else 0,
-                'order_count': row[4]
-            })
-        
-        return jsonify({'success': True, 'data': report_data})
+        return rows_response(PRODUCT_REPORT_ROWS, report)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -247,27 +539,51 @@ def get_product_sales_report():
 def get_customer_report():
     try:
         report = db.get_customer_report()
-        
-        report_data = []
-        for row in report:
-            report_data.append({
-                'customer_name': row[0],
-                'customer_type': row[1],
-                'order_count': row[2] if row[2] else 0,
-                'total_spent': float(row[3]) if row[3] else 0,
-                'avg_order_value': float(row[4]) if row[4] else 0,
-                'last_order_date': row[5]
-            })
-        
-        return jsonify({'success': True, 'data': report_data})
+        return rows_response(CUSTOMER_REPORT_ROWS, report)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    if not session.get('admin_logged_in'):
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    if request.args.get('reset') == '1':
+        db.db_manager.monitor.reset()
+    return jsonify({'success': True, 'data': {
+        'queries': db.db_manager.query_stats(),
+        'pool': db.db_manager.pool_stats(),
+        'order_writer': order_writer.stats(),
+        'member_cache': db.member_cache.stats(),
+        'customer_cache': db.customer_cache.stats(),
+        'sessions': session_store.stats(),
+        'analytics': db.analytics.stats() if db.analytics else None,
+        'replica': db.db_manager.replica_stats(),
+        'order_feed': db.order_feed.stats(),
+        'kitchen_queue': db.kitchen_queue.stats()
+    }})
+
+# Hashed build output: the name changes with the content, so it can be cached forever
+@app.route('/assets/<path:filename>')
+def serve_asset(filename):
+    accepted = {encoding for encoding, quality in request.accept_encodings if quality > 0}
+    path, encoding = assets.resolve(filename, accepted)
+    if path is None:
+        abort(404)
+    response = send_file(path, mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                         max_age=ASSET_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if filename.endswith(static_assets.COMPRESSIBLE):
+        response.vary.add('Accept-Encoding')
+    return response
+
 # Serve images under /picture/* from static/picture directory
 @app.route('/picture/<path:filename>')
 def serve_picture(filename):
     pictures_dir = os.path.join(app.static_folder, 'picture')
-    return send_from_directory(pictures_dir, filename)
+    return send_from_directory(pictures_dir, filename, max_age=24 * 3600)
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5050)
\ No newline at end of file
@@ -0,0 +1,255 @@
+"""
+ASGI entry point for the Coffee Ordering System
+
+    uvicorn asgi:application --workers 4        (or: python serve.py)
+
+The menu endpoints are answered natively on the event loop, with their
+database calls awaited through AsyncCoffeeShopDB, and so is the live order
+stream, so an open admin screen does not hold a thread. Every other request is
+handed to the Flask app, which runs unchanged on a bounded thread pool;
+reports and exports get a pool of their own so long aggregate queries never
+hold up menu reads, logins or order placement.
+"""
+
+import asyncio
+import io
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import CookieError, SimpleCookie
+from urllib.parse import parse_qs
+
+import order_feed
+from app import ORDER_STREAM_HEADERS, ORDER_STREAM_KEEPALIVE, ORDER_STREAM_RETRY, app, db, order_writer
+from async_db import AsyncCoffeeShopDB
+
+adb = AsyncCoffeeShopDB(db, report_workers=int(os.environ.get('REPORT_THREADS', 2)))
+
+# Threads running Flask handlers (regular requests / reports and exports)
+_wsgi_executor = ThreadPoolExecutor(int(os.environ.get('WSGI_THREADS', 16)), thread_name_prefix='wsgi')
+_report_executor = ThreadPoolExecutor(adb.report_workers, thread_name_prefix='wsgi-report')
+
+REPORT_PREFIXES = ('/api/reports/', '/api/orders/export')
+
+
+async def menu_response(scope, send, payload):
+    """Send a (json_bytes, etag) payload; answers If-None-Match with 304 like the Flask route."""
+    try:
+        body, etag = await payload()
+    except Exception as e:
+        await send_json(send, 500, {'success': False, 'error': str(e)})
+        return
+
+    request_headers = dict(scope['headers'])
+    quoted = f'"{etag}"'.encode()
+    headers = [(b'etag', quoted), (b'cache-control', b'public, no-cache')]
+    if b'origin' in request_headers:
+        headers.append((b'access-control-allow-origin', b'*'))
+
+    if_none_match = request_headers.get(b'if-none-match', b'')
+    tags = [tag.strip().removeprefix(b'W/') for tag in if_none_match.split(b',')]
+    if quoted in tags or b'*' in tags:
+        await send({'type': 'http.response.start', 'status': 304, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+
+    headers += [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body if scope['method'] != 'HEAD' else b''})
+
+
+async def send_json(send, status, data):
+    body = json.dumps(data).encode()
+    await send({'type': 'http.response.start', 'status': status, 'headers': [
+        (b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())
+    ]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+NATIVE_ROUTES = {
+    '/api/products': adb.get_products_payload,
+    '/api/categories': adb.get_categories_payload,
+}
+
+ORDER_STREAM_PATH = '/api/orders/stream'
+
+
+async def load_session(scope):
+    """Server-side session data of the request's session cookie, or None."""
+    cookie = dict(scope['headers']).get(b'cookie')
+    if not cookie:
+        return None
+    try:
+        morsel = SimpleCookie(cookie.decode('latin1')).get(app.config['SESSION_COOKIE_NAME'])
+    except CookieError:
+        return None
+    if morsel is None:
+        return None
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_wsgi_executor, app.session_interface.store.get, morsel.value)
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def order_stream(scope, receive, send):
+    """The /api/orders/stream route of app.py, served on the event loop."""
+    data = await load_session(scope)
+    if not data or not data.get('admin_logged_in'):
+        await send_json(send, 401, {'success': False, 'error': 'Unauthorized'})
+        return
+
+    request_headers = dict(scope['headers'])
+    query = parse_qs(scope['query_string'].decode('latin1'))
+    last_event_id = order_feed.parse_last_event_id(
+        request_headers.get(b'last-event-id', b'').decode('latin1') or query.get('last_event_id', [None])[0])
+
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+
+    def notify():
+        loop.call_soon_threadsafe(wake.set)
+
+    subscription = await loop.run_in_executor(_wsgi_executor, db.order_feed.subscribe, last_event_id, notify)
+    disconnected = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        headers = [(b'content-type', b'text/event-stream; charset=utf-8')]
+        headers += [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in ORDER_STREAM_HEADERS.items()]
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': ORDER_STREAM_RETRY, 'more_body': True})
+        while not subscription.closed:
+            woken = asyncio.ensure_future(wake.wait())
+            await asyncio.wait({woken, disconnected}, timeout=ORDER_STREAM_KEEPALIVE,
+                               return_when=asyncio.FIRST_COMPLETED)
+            woken.cancel()
+            if disconnected.done():
+                return
+            wake.clear()
+            events = subscription.drain()
+            body = b''.join(map(order_feed.format_event, events)) if events else order_feed.KEEPALIVE
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        # Ended after a partial replay, or dropped for falling behind: send what is left and end
+        # the response; the browser reconnects with Last-Event-ID
+        events = subscription.drain()
+        await send({'type': 'http.response.body', 'body': b''.join(map(order_feed.format_event, events))})
+    finally:
+        disconnected.cancel()
+        db.order_feed.unsubscribe(subscription)
+
+
+def build_environ(scope, body):
+    """PEP 3333 environ for an ASGI http scope."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin1').upper().replace('-', '_')
+        value = value.decode('latin1')
+        if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+            environ[name] = value
+            continue
+        key = 'HTTP_' + name
+        environ[key] = environ[key] + ',' + value if key in environ else value
+    return environ
+
+
+async def call_flask(scope, receive, send, executor):
+    """Run the Flask app for one request on executor, streaming its body back through send."""
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    environ = build_environ(scope, io.BytesIO(b''.join(chunks)))
+    loop = asyncio.get_running_loop()
+
+    def send_sync(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    def run():
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in headers]
+
+        def start():
+            send_sync({'type': 'http.response.start', 'status': response['status'],
+                       'headers': response['headers']})
+
+        result = app.wsgi_app(environ, start_response)
+        try:
+            started = False
+            for chunk in result:
+                if not chunk:
+                    continue
+                if not started:
+                    start()
+                    started = True
+                send_sync({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if not started:
+                start()
+            send_sync({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+    await loop.run_in_executor(executor, run)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            order_writer.close(timeout=10)
+            db.order_feed.close()
+            adb.close(wait=False)
+            _wsgi_executor.shutdown(wait=False)
+            _report_executor.shutdown(wait=False)
+            db.db_manager.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    path = scope['path']
+    payload = NATIVE_ROUTES.get(path)
+    if payload is not None and scope['method'] in ('GET', 'HEAD'):
+        await menu_response(scope, send, payload)
+    elif path == ORDER_STREAM_PATH and scope['method'] == 'GET':
+        await order_stream(scope, receive, send)
+    elif path.startswith(REPORT_PREFIXES):
+        await call_flask(scope, receive, send, _report_executor)
+    else:
+        await call_flask(scope, receive, send, _wsgi_executor)
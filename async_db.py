@@ -0,0 +1,125 @@
+"""
+Async access to CoffeeShopDB for the ASGI entry point
+
+sqlite3 calls block, so every coroutine here hands the synchronous
+CoffeeShopDB method to a bounded thread pool and awaits the result; the event
+loop itself never touches the database. Reports and exports run on a second,
+smaller pool so a burst of long aggregate queries cannot take every worker
+(and every pooled connection) away from menu reads and order writes.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncCoffeeShopDB:
+    def __init__(self, db, max_workers=None, report_workers=2):
+        self.db = db
+        pool_size = db.db_manager.pool.max_size
+        # Keep at least one pooled connection free of reports
+        self.report_workers = max(1, min(report_workers, pool_size - 1))
+        self.max_workers = max_workers or max(1, pool_size - self.report_workers)
+        self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='db')
+        self._report_executor = ThreadPoolExecutor(self.report_workers, thread_name_prefix='db-report')
+
+    async def _run(self, executor, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+    def run(self, func, *args, **kwargs):
+        """Await any blocking callable on the general database pool."""
+        return self._run(self._executor, func, *args, **kwargs)
+
+    def run_report(self, func, *args, **kwargs):
+        """Await a long-running callable on the report pool."""
+        return self._run(self._report_executor, func, *args, **kwargs)
+
+    def close(self, wait=True):
+        self._executor.shutdown(wait=wait)
+        self._report_executor.shutdown(wait=wait)
+
+    # --- menu
+
+    async def get_all_products(self):
+        return await self.run(self.db.get_all_products)
+
+    async def get_categories(self):
+        return await self.run(self.db.get_categories)
+
+    async def get_catalog_version(self):
+        return await self.run(self.db.get_catalog_version)
+
+    async def get_products_payload(self):
+        return await self.run(self.db.get_products_payload)
+
+    async def get_categories_payload(self):
+        return await self.run(self.db.get_categories_payload)
+
+    # --- customers
+
+    async def create_customer(self, name, phone, email, address, customer_type='regular'):
+        return await self.run(self.db.create_customer, name, phone, email, address, customer_type)
+
+    async def register_member(self, name, email, password, phone='', address='', date_of_birth=None):
+        return await self.run(self.db.register_member, name, email, password, phone, address, date_of_birth)
+
+    async def create_member_customer(self, customer_id, password, date_of_birth=None):
+        return await self.run(self.db.create_member_customer, customer_id, password, date_of_birth)
+
+    async def get_member_by_email(self, email):
+        return await self.run(self.db.get_member_by_email, email)
+
+    async def verify_member_login(self, email, password):
+        return await self.run(self.db.verify_member_login, email, password)
+
+    # --- orders
+
+    async def create_order(self, customer_id, payment_method, order_items):
+        return await self.run(self.db.create_order, customer_id, payment_method, order_items)
+
+    async def create_orders_bulk(self, orders):
+        return await self.run(self.db.create_orders_bulk, orders)
+
+    async def get_orders_page(self, **kwargs):
+        return await self.run(self.db.get_orders_page, **kwargs)
+
+    async def get_order_details(self, order_id):
+        return await self.run(self.db.get_order_details, order_id)
+
+    async def get_order_history(self, customer_id=None):
+        return await self.run_report(self.db.get_order_history, customer_id)
+
+    async def iter_orders_with_items(self, start_date=None, end_date=None, batch_size=1000):
+        """Async generator over iter_orders_with_items, fetching batch_size orders per executor hop."""
+        orders = self.db.iter_orders_with_items(start_date, end_date, batch_size)
+        take = functools.partial(_take, orders, batch_size)
+        try:
+            while True:
+                batch = await self.run_report(take)
+                for order in batch:
+                    yield order
+                if len(batch) < batch_size:
+                    break
+        finally:
+            await self.run_report(orders.close)
+
+    # --- reports
+
+    async def get_sales_report(self, start_date=None, end_date=None):
+        return await self.run_report(self.db.get_sales_report, start_date, end_date)
+
+    async def get_product_sales_report(self):
+        return await self.run_report(self.db.get_product_sales_report)
+
+    async def get_customer_report(self):
+        return await self.run_report(self.db.get_customer_report)
+
+
+def _take(iterator, n):
+    batch = []
+    for item in iterator:
+        batch.append(item)
+        if len(batch) >= n:
+            break
+    return batch
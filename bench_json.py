@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: JSON serialization of API result rows
+
+Compares the handlers' previous path (a dict per row built in a Python loop,
+then jsonify) with json_rows.RowSerializer for the order list and the
+customer report, on synthetic rows shaped like CoffeeShopDB results. Both
+outputs are checked to decode to the same data before timing.
+
+Usage:
+    python bench_json.py
+    python bench_json.py --rows 100,500,5000 --repeat 50
+"""
+
+import argparse
+import json
+import random
+import timeit
+
+from flask import Flask, jsonify
+
+import json_rows
+
+app = Flask(__name__)
+
+# Same fields as the serializers in app.py (imported here without starting the app)
+ORDER_ROWS = json_rows.RowSerializer(
+    'order_id', 'customer_name', 'order_date', 'status', 'payment_method', ('total_amount', float))
+CUSTOMER_REPORT_ROWS = json_rows.RowSerializer(
+    'customer_name', 'customer_type', ('order_count', json_rows.or_zero),
+    ('total_spent', json_rows.float_or_zero), ('avg_order_value', json_rows.float_or_zero), 'last_order_date')
+
+
+def order_rows(n, seed=42):
+    rng = random.Random(seed)
+    return [
+        (i, f"Customer {rng.randint(1, 500)}", f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 12:00:00",
+         'completed', rng.choice(['cash', 'card', 'mobile']), float(rng.randint(20, 400)))
+        for i in range(n, 0, -1)
+    ]
+
+
+def customer_rows(n, seed=42):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        orders = rng.randint(0, 40)
+        spent = float(rng.randint(20, 400) * orders) if orders else None
+        rows.append((f"Customer {i}", rng.choice(['regular', 'member']), orders, spent,
+                     spent / orders if orders else None, '2025-10-01 12:00:00' if orders else None))
+    return rows
+
+
+def legacy_orders(rows):
+    order_list = []
+    for order in rows:
+        order_list.append({
+            'order_id': order[0],
+            'customer_name': order[1],
+            'order_date': order[2],
+            'status': order[3],
+            'payment_method': order[4],
+            'total_amount': float(order[5])
+        })
+    return jsonify({'success': True, 'data': order_list, 'next_cursor': None}).get_data()
+
+
+def legacy_customers(rows):
+    report_data = []
+    for row in rows:
+        report_data.append({
+            'customer_name': row[0],
+            'customer_type': row[1],
+            'order_count': row[2] if row[2] else 0,
+            'total_spent': float(row[3]) if row[3] else 0,
+            'avg_order_value': float(row[4]) if row[4] else 0,
+            'last_order_date': row[5]
+        })
+    return jsonify({'success': True, 'data': report_data}).get_data()
+
+
+CASES = {
+    'orders': (order_rows, legacy_orders, lambda rows: json_rows.envelope(ORDER_ROWS.encode(rows), next_cursor=None)),
+    'customers': (customer_rows, legacy_customers, lambda rows: json_rows.envelope(CUSTOMER_REPORT_ROWS.encode(rows))),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON serialization micro-benchmark')
+    parser.add_argument('--rows', default='50,500,5000', help='Comma-separated result sizes')
+    parser.add_argument('--repeat', type=int, default=20, help='Timed calls per measurement (best of 5)')
+    args = parser.parse_args()
+
+    encoder = 'orjson' if json_rows.orjson is not None else 'stdlib json'
+    print(f"Encoder: {encoder}")
+    print(f"{'case':<10} {'rows':>6} {'legacy ms':>10} {'rows ms':>10} {'speedup':>8}")
+    with app.app_context():
+        for name, (make_rows, legacy, fast) in CASES.items():
+            for n in (int(v) for v in args.rows.split(',')):
+                rows = make_rows(n)
+                if json.loads(legacy(rows)) != json.loads(fast(rows)):
+                    raise SystemExit(f"{name}: outputs differ for {n} rows")
+                before = min(timeit.repeat(lambda: legacy(rows), number=args.repeat, repeat=5)) / args.repeat
+                after = min(timeit.repeat(lambda: fast(rows), number=args.repeat, repeat=5)) / args.repeat
+                print(f"{name:<10} {n:>6} {before * 1000:>10.3f} {after * 1000:>10.3f} {before / after:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite - repeatable load tests for the Flask API and CoffeeShopDB
+
+Builds a dataset of the requested size in its own database file (bulk
+inserts, reusing the demo data generator), then drives each scenario with
+concurrent workers through the Flask test client and/or CoffeeShopDB
+directly. Latency percentiles and throughput per scenario are printed and
+saved as JSON so runs can be compared.
+
+Usage:
+    python benchmark.py --orders 100000 --workers 8 --requests 200
+    python benchmark.py --target db --scenarios menu,report_sales
+    python benchmark.py --compare bench_results/before.json
+    python benchmark.py --scenarios login --workers 32 --kdf-workers 4
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import customers
+from credentials import ALGORITHMS, PasswordHasher
+from database import CoffeeShopDB
+from demo_data import DEMO_CUSTOMERS, PAYMENT_METHODS, random_order_items
+
+BENCH_PASSWORD = 'bench123'
+MEMBER_COUNT = 100
+
+
+# ---------------------------------------------------------------------------
+# Dataset generation
+# ---------------------------------------------------------------------------
+
+def generate_dataset(db_path, orders, days=365, seed=42, chunk_size=50000, hasher=None):
+    """Top the database up to `orders` orders; returns the CoffeeShopDB for it"""
+    db = CoffeeShopDB(db_path, hasher=hasher)
+    rng = random.Random(seed)
+    products = {p[0]: p[2] for p in db.get_all_products()}
+    product_ids = list(products)
+
+    with db.db_manager.connection() as conn:
+        existing = conn.execute("SELECT COUNT(*) FROM CYEAE_ORDERS").fetchone()[0]
+        if existing >= orders:
+            print(f"📦 Reusing {db_path}: {existing} orders already present")
+            return db
+
+        # Throwaway benchmark data: trade durability for load speed
+        conn.execute("PRAGMA synchronous = OFF")
+        started = time.perf_counter()
+
+        customer_target = max(orders // 20, 10)
+        customer_count = conn.execute("SELECT COUNT(*) FROM CYEAE_CUSTOMER").fetchone()[0]
+        if customer_count < customer_target:
+            rows = []
+            for i in range(customer_count, customer_target):
+                name, phone, email, address, customer_type = DEMO_CUSTOMERS[i % len(DEMO_CUSTOMERS)]
+                local, domain = email.split('@')
+                rows.append((f"{name} {i}", f"{phone[:-4]}{i % 10000:04d}", f"{local}.{i}@{domain}", address, customer_type))
+            conn.executemany("""
+                INSERT INTO CYEAE_CUSTOMER (NAME, PHONE, EMAIL, ADDRESS, CUSTOMER_TYPE) VALUES (?, ?, ?, ?, ?)
+            """, rows)
+            conn.commit()
+
+        password_hash = db.db_manager.hash_password(BENCH_PASSWORD)
+        conn.execute("""
+            INSERT OR IGNORE INTO CYEAE_MEMBER_CUSTOMERS (CUSTOMER_ID, PASSWORD_HASH, DATE_OF_BIRTH)
+            SELECT CUSTOMER_ID, ?, '1990-01-01' FROM CYEAE_CUSTOMER
+            WHERE EMAIL LIKE '%.%@example.com' ORDER BY CUSTOMER_ID LIMIT ?
+        """, (password_hash, MEMBER_COUNT))
+        # Phone/email keys as migration 8 assigns them, so walk-in orders match these customers
+        customers.assign_keys(conn.cursor())
+        conn.commit()
+        customer_ids = [row[0] for row in conn.execute("SELECT CUSTOMER_ID FROM CYEAE_CUSTOMER")]
+
+        next_order_id = (conn.execute("SELECT MAX(ORDER_ID) FROM CYEAE_ORDERS").fetchone()[0] or 0) + 1
+        now = datetime.now()
+        remaining = orders - existing
+        while remaining > 0:
+            batch = min(chunk_size, remaining)
+            order_rows, item_rows = [], []
+            for order_id in range(next_order_id, next_order_id + batch):
+                order_date = now - timedelta(seconds=rng.randint(0, days * 86400))
+                total = 0
+                for item in random_order_items(product_ids, rng):
+                    price = products[item['product_id']]
+                    line_amount = price * item['quantity']
+                    total += line_amount
+                    item_rows.append((order_id, item['product_id'], item['quantity'], price, line_amount))
+                order_rows.append((order_id, rng.choice(customer_ids), order_date.strftime('%Y-%m-%d %H:%M:%S'),
+                                   'completed', rng.choice(PAYMENT_METHODS), total))
+            conn.executemany("""
+                INSERT INTO CYEAE_ORDERS (ORDER_ID, CUSTOMER_ID, ORDER_DATE, STATUS, PAYMENT_METHOD, TOTAL_AMOUNT)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, order_rows)
+            conn.executemany("""
+                INSERT INTO CYEAE_ORDER_ITEMS (ORDER_ID, PRODUCT_ID, QUANTITY, UNIT_PRICE, LINE_AMOUNT)
+                VALUES (?, ?, ?, ?, ?)
+            """, item_rows)
+            conn.commit()
+            next_order_id += batch
+            remaining -= batch
+            print(f"   ... {orders - remaining}/{orders} orders")
+
+        conn.execute("ANALYZE")
+        conn.commit()
+        conn.execute("PRAGMA synchronous = NORMAL")
+        print(f"✅ Dataset ready in {time.perf_counter() - started:.1f}s")
+    return db
+
+
+# ---------------------------------------------------------------------------
+# Scenarios
+# ---------------------------------------------------------------------------
+
+def _member_email(db):
+    with db.db_manager.connection() as conn:
+        rows = conn.execute("""
+            SELECT c.EMAIL FROM CYEAE_CUSTOMER c JOIN CYEAE_MEMBER_CUSTOMERS m ON c.CUSTOMER_ID = m.CUSTOMER_ID
+            WHERE c.EMAIL LIKE '%.%@example.com' LIMIT ?
+        """, (MEMBER_COUNT,)).fetchall()
+    return [row[0] for row in rows]
+
+
+def db_scenarios(db):
+    """name -> factory returning a per-worker callable that reports success"""
+    product_ids = [p[0] for p in db.get_all_products()]
+    emails = _member_email(db)
+    month_ago = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+
+    def create_order():
+        return db.create_order(1, random.choice(PAYMENT_METHODS), random_order_items(product_ids)) is not None
+
+    return {
+        'menu': lambda: (lambda: bool(db.get_all_products())),
+        'categories': lambda: (lambda: bool(db.get_categories())),
+        'create_order': lambda: create_order,
+        'login': lambda: (lambda: db.verify_member_login(random.choice(emails), BENCH_PASSWORD) is not None),
+        'orders_page': lambda: (lambda: db.get_orders_page(limit=50) is not None),
+        'report_sales': lambda: (lambda: db.get_sales_report(month_ago) is not None),
+        'report_products': lambda: (lambda: db.get_product_sales_report() is not None),
+        'report_customers': lambda: (lambda: db.get_customer_report() is not None),
+    }
+
+
+def flask_scenarios(db):
+    import app as flask_app
+
+    product_ids = [p[0] for p in db.get_all_products()]
+    emails = _member_email(db)
+    month_ago = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+
+    def client():
+        c = flask_app.app.test_client()
+        with c.session_transaction() as session:
+            session['admin_logged_in'] = True
+        return c
+
+    def get(path):
+        def factory():
+            c = client()
+            return lambda: c.get(path).status_code < 400
+        return factory
+
+    def create_order():
+        c = client()
+        return lambda: c.post('/api/orders', json={
+            'customer_id': 1,
+            'payment_method': random.choice(PAYMENT_METHODS),
+            'items': random_order_items(product_ids)
+        }).status_code < 400
+
+    def login():
+        c = client()
+        return lambda: c.post('/api/auth/login', json={
+            'email': random.choice(emails), 'password': BENCH_PASSWORD
+        }).status_code < 400
+
+    return {
+        'menu': get('/api/products'),
+        'categories': get('/api/categories'),
+        'create_order': create_order,
+        'login': login,
+        'orders_page': get('/api/orders?limit=50'),
+        'report_sales': get(f'/api/reports/sales?start_date={month_ago}'),
+        'report_products': get('/api/reports/products'),
+        'report_customers': get('/api/reports/customers'),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def run_scenario(factory, workers, requests):
+    """Run `requests` calls per worker on `workers` threads; returns the stats dict"""
+    barrier = threading.Barrier(workers)
+
+    def worker():
+        call = factory()
+        latencies, errors = [], 0
+        barrier.wait()
+        for _ in range(requests):
+            start = time.perf_counter()
+            try:
+                ok = call()
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            if not ok:
+                errors += 1
+        return latencies, errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        outcomes = list(pool.map(lambda _: worker(), range(workers)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(l for outcome in outcomes for l in outcome[0])
+    return {
+        'requests': len(latencies),
+        'errors': sum(outcome[1] for outcome in outcomes),
+        'elapsed_s': round(elapsed, 4),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results, baseline=None):
+    header = f"{'scenario':<28}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}"
+    if baseline:
+        header += f"{'Δ p95':>10}"
+    print(header)
+    print('-' * len(header))
+    for name, stats in results.items():
+        line = (f"{name:<28}{stats['throughput_rps']:>10.1f}{stats['p50_ms']:>10.2f}"
+                f"{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['errors']:>8}")
+        if baseline and name in baseline and baseline[name]['p95_ms']:
+            change = (stats['p95_ms'] - baseline[name]['p95_ms']) / baseline[name]['p95_ms'] * 100
+            line += f"{change:>+9.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Coffee Ordering System benchmark suite')
+    parser.add_argument('--db', default='bench.db', help='Benchmark database file (never the live one)')
+    parser.add_argument('--orders', type=int, default=10000, help='Dataset size in orders (10k-10M)')
+    parser.add_argument('--days', type=int, default=365, help='Spread order dates over this many days')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent workers per scenario')
+    parser.add_argument('--requests', type=int, default=100, help='Calls per worker per scenario')
+    parser.add_argument('--target', choices=['flask', 'db', 'both'], default='both')
+    parser.add_argument('--scenarios', help='Comma-separated subset of scenarios to run')
+    parser.add_argument('--hasher', choices=ALGORITHMS, default='scrypt', help='Password KDF for member logins')
+    parser.add_argument('--kdf-workers', type=int, default=2, help='Threads computing password hashes')
+    parser.add_argument('--output', help='Results JSON path (default: bench_results/<timestamp>.json)')
+    parser.add_argument('--compare', help='Earlier results JSON to diff against')
+    args = parser.parse_args()
+
+    if os.path.abspath(args.db) == os.path.abspath('coffee_shop.db'):
+        sys.exit("Refusing to benchmark against the live coffee_shop.db")
+
+    print(f"🏗  Preparing dataset: {args.orders} orders in {args.db}")
+    hasher = PasswordHasher(algorithm=args.hasher, workers=args.kdf_workers)
+    db = generate_dataset(args.db, args.orders, days=args.days, seed=args.seed, hasher=hasher)
+    os.environ['COFFEE_DB_PATH'] = args.db
+    os.environ['PASSWORD_HASHER'] = args.hasher
+    os.environ['KDF_WORKERS'] = str(args.kdf_workers)
+    random.seed(args.seed)
+
+    suites = []
+    if args.target in ('db', 'both'):
+        suites.append(('db', db_scenarios(db)))
+    if args.target in ('flask', 'both'):
+        suites.append(('flask', flask_scenarios(db)))
+    wanted = set(args.scenarios.split(',')) if args.scenarios else None
+
+    results = {}
+    for target, scenarios in suites:
+        for name, factory in scenarios.items():
+            if wanted and name not in wanted:
+                continue
+            print(f"⏱  {target}:{name} ({args.workers} workers x {args.requests})")
+            results[f"{target}:{name}"] = run_scenario(factory, args.workers, args.requests)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    print()
+    print_table(results, baseline)
+
+    output = args.output or os.path.join('bench_results', datetime.now().strftime('%Y%m%d_%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'meta': {
+                'timestamp': datetime.now().isoformat(timespec='seconds'),
+                'git_revision': _git_revision(),
+                'orders': args.orders,
+                'workers': args.workers,
+                'requests_per_worker': args.requests,
+                'hasher': args.hasher,
+                'kdf_workers': args.kdf_workers,
+                'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'pool_stats': db.db_manager.pool_stats(),
+            },
+            'results': results,
+        }, f, indent=2)
+    print(f"\n💾 Results saved to {output}")
+
+
+if __name__ == '__main__':
+    main()
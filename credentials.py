@@ -0,0 +1,155 @@
+"""
+Member credentials for the Coffee Ordering System
+
+PasswordHasher produces salted scrypt (default) or PBKDF2-SHA256 hashes from
+the standard library, stored as self-describing strings:
+
+    scrypt$<n>$<r>$<p>$<salt>$<hash>
+    pbkdf2_sha256$<iterations>$<salt>$<hash>
+
+Hashes written before this module existed are bare unsalted SHA-256 hex
+digests; they still verify, and needs_rehash() reports them (and hashes with
+outdated parameters) so the login path can upgrade them in place. KDF work
+runs on a small dedicated thread pool, which bounds how many CPU-heavy hashes
+are in flight at once so a burst of logins cannot starve other requests.
+
+MemberCache is a bounded LRU of email -> member row used by
+CoffeeShopDB.verify_member_login.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+ALGORITHMS = ('scrypt', 'pbkdf2_sha256')
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+class PasswordHasher:
+    def __init__(self, algorithm='scrypt', scrypt_n=2 ** 14, scrypt_r=8, scrypt_p=1,
+                 pbkdf2_iterations=600000, workers=2, salt_bytes=16):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown password hash algorithm: {algorithm}")
+        self.algorithm = algorithm
+        self.scrypt_params = (scrypt_n, scrypt_r, scrypt_p)
+        self.pbkdf2_iterations = pbkdf2_iterations
+        self.salt_bytes = salt_bytes
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix='kdf')
+        # A real hash to verify against when the email is unknown, so failed
+        # logins take the same time whether or not the account exists
+        self._dummy_hash = self._hash(os.urandom(16).hex())
+
+    def hash(self, password):
+        return self._executor.submit(self._hash, password).result()
+
+    def verify(self, password, stored):
+        return self._executor.submit(self._verify, password, stored).result()
+
+    def verify_dummy(self, password):
+        self.verify(password, self._dummy_hash)
+        return False
+
+    def needs_rehash(self, stored):
+        if not stored or '$' not in stored:
+            return True
+        algorithm, _, params = stored.partition('$')
+        if algorithm != self.algorithm:
+            return True
+        if algorithm == 'scrypt':
+            return tuple(int(v) for v in params.split('$')[:3]) != self.scrypt_params
+        return int(params.split('$')[0]) != self.pbkdf2_iterations
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    def _hash(self, password):
+        salt = os.urandom(self.salt_bytes)
+        if self.algorithm == 'scrypt':
+            n, r, p = self.scrypt_params
+            digest = self._scrypt(password, salt, n, r, p)
+            return f"scrypt${n}${r}${p}${_b64(salt)}${_b64(digest)}"
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, self.pbkdf2_iterations)
+        return f"pbkdf2_sha256${self.pbkdf2_iterations}${_b64(salt)}${_b64(digest)}"
+
+    def _scrypt(self, password, salt, n, r, p):
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r + 1024 * 1024, dklen=32)
+
+    def _verify(self, password, stored):
+        if not stored:
+            return False
+        try:
+            if stored.startswith('scrypt$'):
+                n, r, p, salt, digest = stored.split('$')[1:]
+                candidate = self._scrypt(password, _unb64(salt), int(n), int(r), int(p))
+            elif stored.startswith('pbkdf2_sha256$'):
+                iterations, salt, digest = stored.split('$')[1:]
+                candidate = hashlib.pbkdf2_hmac('sha256', password.encode(), _unb64(salt), int(iterations))
+            else:
+                # Legacy unsalted SHA-256 hex digest
+                return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+        except ValueError:
+            return False
+        return hmac.compare_digest(candidate, _unb64(digest))
+
+
+class MemberCache:
+    """Bounded LRU of email -> member row; entries also expire after ttl seconds."""
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, email):
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self._entries.move_to_end(email)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[email]
+            self.misses += 1
+            return None
+
+    def put(self, email, member):
+        with self._lock:
+            self._entries[email] = (time.monotonic(), member)
+            self._entries.move_to_end(email)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, email=None):
+        with self._lock:
+            if email is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(email, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
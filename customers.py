@@ -0,0 +1,176 @@
+"""
+Customer matching for walk-in orders
+
+Walk-in orders used to insert a new CYEAE_CUSTOMER row every time, so a
+regular who never signed up piled up one row per visit. Customers now carry
+normalized copies of their phone number and email (PHONE_KEY, EMAIL_KEY,
+each under a unique partial index, migration 8), and CoffeeShopDB reuses
+the walk-in row whose key matches instead of inserting another one. A key
+owned by a member is never matched: orders only reach a member's account
+through a login.
+
+- normalize_phone / normalize_email define what counts as the same contact
+- assign_keys() gives every key to one customer: members first, then the
+  oldest row; the others keep their PHONE/EMAIL but no key
+- merge_duplicates() is the one-off clean-up of rows created before
+  matching existed: it folds every group of walk-in customers sharing a
+  phone or email into one row and re-points their orders; members are
+  never merged (`python manage.py dedup-customers`)
+- CustomerKeyCache remembers key -> CUSTOMER_ID for the order path
+"""
+
+import re
+import threading
+from collections import OrderedDict
+
+# Shorter digit strings (extensions, placeholders like '0') identify nobody
+MIN_PHONE_DIGITS = 6
+
+
+def normalize_phone(phone):
+    """Digits only ('+852 9123-4567' -> '85291234567'), or None if too short to identify anyone."""
+    digits = re.sub(r'\D', '', phone or '')
+    return digits if len(digits) >= MIN_PHONE_DIGITS else None
+
+
+def normalize_email(email):
+    """Trimmed and lower-cased, or None if it is not an address."""
+    email = (email or '').strip().lower()
+    return email if '@' in email else None
+
+
+def _load_customers(cursor):
+    """(CUSTOMER_ID, PHONE, EMAIL, is_member) for every customer, members first, then oldest first."""
+    return cursor.execute("""
+        SELECT c.CUSTOMER_ID, c.PHONE, c.EMAIL, m.CUSTOMER_ID IS NOT NULL AS IS_MEMBER
+        FROM CYEAE_CUSTOMER c
+        LEFT JOIN CYEAE_MEMBER_CUSTOMERS m ON m.CUSTOMER_ID = c.CUSTOMER_ID
+        ORDER BY IS_MEMBER DESC, c.CUSTOMER_ID
+    """).fetchall()
+
+
+def assign_keys(cursor):
+    """Recompute PHONE_KEY/EMAIL_KEY of every customer so that each key has one owner."""
+    phones = {}
+    emails = {}
+    for customer_id, phone, email, _ in _load_customers(cursor):
+        phones.setdefault(normalize_phone(phone), customer_id)
+        emails.setdefault(normalize_email(email), customer_id)
+    phones.pop(None, None)
+    emails.pop(None, None)
+    cursor.execute("UPDATE CYEAE_CUSTOMER SET PHONE_KEY = NULL, EMAIL_KEY = NULL")
+    cursor.executemany("UPDATE CYEAE_CUSTOMER SET PHONE_KEY = ? WHERE CUSTOMER_ID = ?", phones.items())
+    cursor.executemany("UPDATE CYEAE_CUSTOMER SET EMAIL_KEY = ? WHERE CUSTOMER_ID = ?", emails.items())
+    return len(phones), len(emails)
+
+
+def merge_duplicates(cursor):
+    """Fold walk-in customers sharing a normalized phone or email into one row, in the caller's transaction.
+
+    Each group (linked through any shared phone or email) keeps its oldest
+    row; orders of the other rows are re-pointed to it, a missing
+    phone/email is filled in from them, and they are deleted. Members are
+    neither merged nor merged into. Returns a stats dict.
+    """
+    customers = [row for row in _load_customers(cursor) if not row[3]]
+    # Rows come oldest first: the group root is always its oldest row
+    rank = {row[0]: i for i, row in enumerate(customers)}
+    parent = {customer_id: customer_id for customer_id in rank}
+
+    def find(customer_id):
+        while parent[customer_id] != customer_id:
+            parent[customer_id] = parent[parent[customer_id]]
+            customer_id = parent[customer_id]
+        return customer_id
+
+    owners = {}
+    for customer_id, phone, email, _ in customers:
+        for key in (('phone', normalize_phone(phone)), ('email', normalize_email(email))):
+            if key[1] is None:
+                continue
+            a, b = find(owners.setdefault(key, customer_id)), find(customer_id)
+            if a != b:
+                a, b = (a, b) if rank[a] < rank[b] else (b, a)
+                parent[b] = a
+
+    groups = {}
+    for row in customers:
+        groups.setdefault(find(row[0]), []).append(row)
+
+    moves = []
+    fills = []
+    stats = {'customers': len(customers), 'groups': 0, 'merged': 0, 'orders_moved': 0}
+    for survivor_id, rows in groups.items():
+        if len(rows) == 1:
+            continue
+        stats['groups'] += 1
+        survivor = next(row for row in rows if row[0] == survivor_id)
+        phone, email = survivor[1], survivor[2]
+        for customer_id, other_phone, other_email, _ in rows:
+            if customer_id == survivor_id:
+                continue
+            moves.append((survivor_id, customer_id))
+            if normalize_phone(phone) is None and normalize_phone(other_phone) is not None:
+                phone = other_phone
+            if normalize_email(email) is None and normalize_email(other_email) is not None:
+                email = other_email
+        if (phone, email) != (survivor[1], survivor[2]):
+            fills.append((phone, email, survivor_id))
+
+    cursor.executemany("UPDATE CYEAE_ORDERS SET CUSTOMER_ID = ? WHERE CUSTOMER_ID = ?", moves)
+    stats['orders_moved'] = cursor.rowcount
+    cursor.executemany("DELETE FROM CYEAE_CUSTOMER WHERE CUSTOMER_ID = ?", [(cid,) for _, cid in moves])
+    cursor.executemany("UPDATE CYEAE_CUSTOMER SET PHONE = ?, EMAIL = ? WHERE CUSTOMER_ID = ?", fills)
+    stats['merged'] = len(moves)
+    assign_keys(cursor)
+    return stats
+
+
+class CustomerKeyCache:
+    """Bounded LRU of (key column, normalized key) -> CUSTOMER_ID.
+
+    Entries are hints: the caller re-checks a hit against the row (by
+    primary key), so merged, deleted or rolled-back customers never leak.
+    """
+
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            customer_id = self._entries.get(key)
+            if customer_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return customer_id
+
+    def put(self, key, customer_id):
+        with self._lock:
+            self._entries[key] = customer_id
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -1,17 +1,297 @@
 import sqlite3
+import base64
 import hashlib
-from datetime import datetime, date
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, date, timedelta
+
+import customers
+import migrations
+import sales_buckets
+from analytics import AnalyticsSnapshot
+from credentials import MemberCache, PasswordHasher
+from kitchen_queue import OPEN_STATUSES, KitchenQueue
+from order_feed import OrderFeed
+from query_metrics import InstrumentedConnection, QueryMonitor
+from replica import REPLICA_PRAGMAS, ReadReplica
+
+# Pragmas applied to every pooled connection. WAL lets readers run alongside
+# the single writer; NORMAL sync is durable under WAL except on power loss.
+CONNECTION_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('busy_timeout', 5000),
+    ('cache_size', -16000),
+    ('temp_store', 'MEMORY'),
+)
+
+# Upper bound on bound parameters per IN (...) list, well under SQLite's variable limit
+IN_CLAUSE_CHUNK = 500
+
+# 订单状态流转: 每个状态允许进入的下一个状态
+ORDER_STATUS_TRANSITIONS = {
+    'pending': ('preparing', 'cancelled'),
+    'preparing': ('ready', 'cancelled'),
+    'ready': ('completed', 'cancelled'),
+    'completed': (),
+    'cancelled': (),
+}
+
+# Seconds a dashboard summary is reused, and the days of orders it looks at
+DASHBOARD_TTL = 5
+DASHBOARD_DAYS = 14
+
+class PoolTimeout(Exception):
+    pass
+
+class OrderValidationError(ValueError):
+    pass
+
+class CustomerExists(ValueError):
+    pass
+
+class InvalidStatusTransition(OrderValidationError):
+    pass
+
+class OutOfStock(OrderValidationError):
+    pass
+
+def encode_order_cursor(order_date, order_id):
+    """Opaque keyset cursor for the (ORDER_DATE, ORDER_ID) position of the last row served."""
+    raw = json.dumps([order_date, order_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_order_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        order_date, order_id = json.loads(raw)
+        return str(order_date), int(order_id)
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections.
+
+    A thread that already holds a connection gets the same one back on nested
+    checkouts, so helper methods can call each other without deadlocking.
+    """
+
+    def __init__(self, db_path, max_size=8, timeout=30.0, pragmas=CONNECTION_PRAGMAS, monitor=None):
+        self.db_path = db_path
+        self.monitor = monitor
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pragmas = pragmas
+        self._idle = []
+        self._size = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._stats = {
+            'checkouts': 0,
+            'hits': 0,
+            'misses': 0,
+            'reentrant': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+    def _open(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False,
+                               factory=InstrumentedConnection)
+        for name, value in self.pragmas:
+            conn.execute(f"PRAGMA {name} = {value}")
+        conn.monitor = self.monitor
+        return conn
+
+    def acquire(self):
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            self._local.depth += 1
+            with self._cond:
+                self._stats['checkouts'] += 1
+                self._stats['reentrant'] += 1
+            return held
+
+        start = time.perf_counter()
+        conn = None
+        with self._cond:
+            self._stats['checkouts'] += 1
+            waited = False
+            while not self._idle and self._size >= self.max_size:
+                waited = True
+                remaining = self.timeout - (time.perf_counter() - start)
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(f"no connection available after {self.timeout}s")
+                self._cond.wait(remaining)
+            if waited:
+                elapsed = time.perf_counter() - start
+                self._stats['waits'] += 1
+                self._stats['wait_time_total'] += elapsed
+                self._stats['wait_time_max'] = max(self._stats['wait_time_max'], elapsed)
+            if self._idle:
+                conn = self._idle.pop()
+                self._stats['hits'] += 1
+            else:
+                self._size += 1
+                self._stats['misses'] += 1
+
+        if conn is None:
+            try:
+                conn = self._open()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def release(self, conn):
+        self._local.depth -= 1
+        if self._local.depth > 0:
+            return
+        self._local.conn = None
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def holds_connection(self):
+        """True while the calling thread has a connection checked out of this pool."""
+        return getattr(self._local, 'conn', None) is not None
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['size'] = self._size
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._size - len(self._idle)
+            stats['max_size'] = self.max_size
+        checkouts = stats['checkouts']
+        stats['hit_rate'] = (stats['hits'] + stats['reentrant']) / checkouts if checkouts else 0.0
+        stats['wait_time_avg'] = stats['wait_time_total'] / stats['waits'] if stats['waits'] else 0.0
+        return stats
+
+class CatalogCache:
+    """Serialized menu payloads, rebuilt when the catalog version moves or the TTL lapses."""
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, version, build):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry['version'] == version and now - entry['built_at'] < self.ttl:
+                return entry['body'], entry['etag']
+            body = json.dumps(build(), separators=(',', ':')).encode('utf-8')
+            etag = hashlib.sha1(body).hexdigest()
+            self._entries[key] = {'version': version, 'built_at': now, 'body': body, 'etag': etag}
+            return body, etag
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
 
 class DatabaseManager:
-    def __init__(self, db_path='coffee_shop.db'):
+    def __init__(self, db_path='coffee_shop.db', pool_size=8, pool_timeout=30.0, slow_query_ms=200, hasher=None,
+                 replica_path=None, replica_interval=10.0, replica_max_lag=60.0):
         self.db_path = db_path
+        self.hasher = hasher or PasswordHasher()
+        self.monitor = QueryMonitor(slow_query_ms=slow_query_ms)
+        self.pool = ConnectionPool(db_path, max_size=pool_size, timeout=pool_timeout, monitor=self.monitor)
         self.init_database()
+
+        # 报表与历史查询走只读副本, 副本过期时回退到主库
+        self.replica = None
+        if replica_path:
+            replica_pool = ConnectionPool(replica_path, max_size=pool_size, timeout=pool_timeout,
+                                          pragmas=REPLICA_PRAGMAS, monitor=self.monitor)
+            self.replica = ReadReplica(db_path, replica_path, replica_pool,
+                                       interval=replica_interval, max_lag=replica_max_lag)
+            self.replica.start()
     
     def get_connection(self):
-        return sqlite3.connect(self.db_path)
+        """Open a standalone connection outside the pool; the caller closes it."""
+        return self.pool._open()
+    
+    def connection(self):
+        """Check a connection out of the pool for the duration of a with-block."""
+        return self.pool.connection()
+    
+    def read_connection(self):
+        """Like connection(), for report and history reads: the replica while it is fresh enough.
+
+        A thread that already holds a primary connection keeps using it, so
+        callers inside a transaction still see their own writes.
+        """
+        if self.replica is None or self.pool.holds_connection() or not self.replica.is_fresh():
+            return self.pool.connection()
+        return self.replica.pool.connection()
+
+    def get_read_connection(self):
+        """Standalone counterpart of read_connection(); the caller closes it."""
+        if self.replica is None or not self.replica.is_fresh():
+            return self.pool._open()
+        return self.replica.pool._open()
+
+    def pool_stats(self):
+        return self.pool.stats()
+
+    def replica_stats(self):
+        return self.replica.stats() if self.replica else None
+
+    def close(self):
+        if self.replica is not None:
+            self.replica.close()
+        self.pool.close_all()
+    
+    def query_stats(self):
+        """Per-method and per-statement timings plus recent slow queries."""
+        return self.monitor.snapshot()
     
     def init_database(self):
-        conn = self.get_connection()
+        with self.connection() as conn:
+            self._create_tables(conn)
+            migrations.migrate(conn)
+
+        self.insert_sample_data()
+    
+    def _create_tables(self, conn):
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -78,19 +358,48 @@ class DatabaseManager:
                 FOREIGN KEY (PRODUCT_ID) REFERENCES CYEAE_PRODUCT(PRODUCT_ID)
             )
         ''')
-        
+
         conn.commit()
-        conn.close()
-        
-        self.insert_sample_data()
-    
+
+    def rebuild_daily_sales(self, conn=None):
+        """Recompute CYEAE_DAILY_SALES from CYEAE_ORDERS; returns the number of rollup rows."""
+        if conn is None:
+            with self.connection() as conn:
+                return self.rebuild_daily_sales(conn)
+
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            rows = migrations.rebuild_daily_sales(cursor)
+            conn.commit()
+            return rows
+        except Exception:
+            conn.rollback()
+            raise
+
+    def migrate(self, target=None):
+        """Bring the schema up to date; returns the migrations that were applied."""
+        with self.connection() as conn:
+            return migrations.migrate(conn, target)
+
+    def schema_version(self):
+        with self.connection() as conn:
+            return migrations.current_version(conn)
+
+    def analyze(self):
+        with self.connection() as conn:
+            conn.execute("ANALYZE")
+            conn.commit()
+
     def insert_sample_data(self):
-        conn = self.get_connection()
+        with self.connection() as conn:
+            self._insert_sample_data(conn)
+    
+    def _insert_sample_data(self, conn):
         cursor = conn.cursor()
         
         cursor.execute("SELECT COUNT(*) FROM CYEAE_CATEGORY")
         if cursor.fetchone()[0] > 0:
-            conn.close()
             return
         
         categories = [
@@ -115,70 +424,248 @@ class DatabaseManager:
         ]
         cursor.executemany("INSERT INTO CYEAE_PRODUCT (NAME, PRICE, IS_ACTIVE, CATEGORY_ID) VALUES (?, ?, ?, ?)", products)
         
-        customers = [
+        sample_customers = [
             ('John Smith', '13812345678', 'john@example.com', 'Kowloon', 'regular'),
             ('Sarah Johnson', '13987654321', 'sarah@example.com', 'Hong Kong Island', 'member'),
             ('Mike Wilson', '13555666777', 'mike@example.com', 'New Territories', 'regular')
         ]
-        cursor.executemany("INSERT INTO CYEAE_CUSTOMER (NAME, PHONE, EMAIL, ADDRESS, CUSTOMER_TYPE) VALUES (?, ?, ?, ?, ?)", customers)
+        cursor.executemany("INSERT INTO CYEAE_CUSTOMER (NAME, PHONE, EMAIL, ADDRESS, CUSTOMER_TYPE) VALUES (?, ?, ?, ?, ?)", sample_customers)
         
-        password_hash = hashlib.sha256('123456'.encode()).hexdigest()
+        password_hash = self.hash_password('123456')
         cursor.execute("""
             INSERT INTO CYEAE_MEMBER_CUSTOMERS (CUSTOMER_ID, PASSWORD_HASH, DATE_OF_BIRTH) 
             VALUES (2, ?, ?)
         """, (password_hash, '1990-05-15'))
+        customers.assign_keys(cursor)
         
         conn.commit()
-        conn.close()
     
     def hash_password(self, password):
-        return hashlib.sha256(password.encode()).hexdigest()
+        return self.hasher.hash(password)
     
     def verify_password(self, password, hash_value):
-        return self.hash_password(password) == hash_value
+        return self.hasher.verify(password, hash_value)
 
 class CoffeeShopDB:
-    def __init__(self):
-        self.db_manager = DatabaseManager()
+    def __init__(self, db_path='coffee_shop.db', pool_size=8, slow_query_ms=200, hasher=None, member_cache_size=1024,
+                 analytics_dir=None, replica_path=None, replica_interval=10.0, replica_max_lag=60.0):
+        self.db_manager = DatabaseManager(db_path, pool_size=pool_size, slow_query_ms=slow_query_ms, hasher=hasher,
+                                          replica_path=replica_path, replica_interval=replica_interval,
+                                          replica_max_lag=replica_max_lag)
+        self.catalog_cache = CatalogCache()
+        self.member_cache = MemberCache(max_size=member_cache_size)
+        self.customer_cache = customers.CustomerKeyCache()
+        self.sales_cache = sales_buckets.SalesBucketCache()
+        self._dashboard = None
+        self._dashboard_lock = threading.Lock()
+        # 新订单推送给后台的实时订单流 (SSE)
+        self.order_feed = OrderFeed(self)
+        # 后厨队列: 未完成订单按下单顺序排队, 每次从部分索引读取
+        self.kitchen_queue = KitchenQueue(self)
+        # 报表改由列式快照回答, 不再扫描订单表 (analytics_dir 为空时仍走 SQL)
+        self.analytics = AnalyticsSnapshot(self, analytics_dir) if analytics_dir else None
     
     def get_all_products(self):
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT p.PRODUCT_ID, p.NAME, p.PRICE, p.IS_ACTIVE, c.CATEGORY_NAME
-            FROM CYEAE_PRODUCT p
-            LEFT JOIN CYEAE_CATEGORY c ON p.CATEGORY_ID = c.CATEGORY_ID
-            WHERE p.IS_ACTIVE = 'Y'
-            ORDER BY c.CATEGORY_NAME, p.NAME
-        """)
-        products = cursor.fetchall()
-        conn.close()
-        return products
+        with self.db_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT p.PRODUCT_ID, p.NAME, p.PRICE, p.IS_ACTIVE, c.CATEGORY_NAME, s.QUANTITY
+                FROM CYEAE_PRODUCT p
+                LEFT JOIN CYEAE_CATEGORY c ON p.CATEGORY_ID = c.CATEGORY_ID
+                LEFT JOIN CYEAE_PRODUCT_STOCK s ON s.PRODUCT_ID = p.PRODUCT_ID
+                WHERE p.IS_ACTIVE = 'Y' AND (s.QUANTITY IS NULL OR s.QUANTITY > 0)
+                ORDER BY c.CATEGORY_NAME, p.NAME
+            """)
+            return cursor.fetchall()
     
     def get_categories(self):
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT CATEGORY_ID, CATEGORY_NAME, DESCRIPTION FROM CYEAE_CATEGORY ORDER BY CATEGORY_NAME")
-        categories = cursor.fetchall()
-        conn.close()
-        return categories
+        with self.db_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT CATEGORY_ID, CATEGORY_NAME, DESCRIPTION FROM CYEAE_CATEGORY ORDER BY CATEGORY_NAME")
+            return cursor.fetchall()
     
+    def get_catalog_version(self):
+        with self.db_manager.connection() as conn:
+            row = conn.execute("SELECT VERSION FROM CYEAE_CATALOG_VERSION WHERE ID = 1").fetchone()
+            return row[0] if row else 0
+
+    def get_products_payload(self):
+        """Active products as (json_bytes, etag), served from the catalog cache."""
+        def build():
+            return {'success': True, 'data': [{
+                'id': product[0],
+                'name': product[1],
+                'price': float(product[2]),
+                'is_active': product[3],
+                'category': product[4]
+            } for product in self.get_all_products()]}
+        return self.catalog_cache.get('products', self.get_catalog_version(), build)
+
+    def get_categories_payload(self):
+        """Categories as (json_bytes, etag), served from the catalog cache."""
+        def build():
+            return {'success': True, 'data': [{
+                'id': category[0],
+                'name': category[1],
+                'description': category[2]
+            } for category in self.get_categories()]}
+        return self.catalog_cache.get('categories', self.get_catalog_version(), build)
+
     def create_customer(self, name, phone, email, address, customer_type='regular'):
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
+        """新建客户; an existing walk-in customer with the same phone or email is returned instead.
+
+        Members are never matched this way: their orders need a login.
+        Members sign up through register_member().
+        """
+        with self.db_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                if customer_type == 'member':
+                    customer_id = self._insert_customer(cursor, name, phone, email, address, customer_type)
+                else:
+                    customer_id = self._resolve_customer(cursor, name, phone, email, address, customer_type)
+                conn.commit()
+                return customer_id
+            except Exception:
+                conn.rollback()
+                raise
+
+    def _find_customer(self, cursor, key_column, key):
+        """CUSTOMER_ID owning a PHONE_KEY/EMAIL_KEY, or None."""
+        cache_key = (key_column, key)
+        customer_id = self.customer_cache.get(cache_key)
+        if customer_id is not None:
+            # A primary-key check: the cached row may since have been merged away or rolled back
+            if cursor.execute(f"SELECT 1 FROM CYEAE_CUSTOMER WHERE CUSTOMER_ID = ? AND {key_column} = ?",
+                              (customer_id, key)).fetchone():
+                return customer_id
+            self.customer_cache.invalidate(cache_key)
+        row = cursor.execute(f"SELECT CUSTOMER_ID FROM CYEAE_CUSTOMER WHERE {key_column} = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self.customer_cache.put(cache_key, row[0])
+        return row[0]
+
+    def _resolve_customer(self, cursor, name, phone, email, address, customer_type='regular'):
+        """散客匹配: the walk-in customer with this phone (or else email), or a new one, in the caller's transaction.
+
+        A phone or email owned by a member is not matched: the order gets a
+        customer of its own, and the key stays with the member.
+        """
+        phone_key, email_key = customers.normalize_phone(phone), customers.normalize_email(email)
+        keys = {'PHONE_KEY': phone_key, 'EMAIL_KEY': email_key}
+        matches = (
+            ('PHONE_KEY', phone_key, 'EMAIL', email, email_key),
+            ('EMAIL_KEY', email_key, 'PHONE', phone, phone_key),
+        )
+        for key_column, key, other_column, other_value, other_key in matches:
+            if key is None:
+                continue
+            customer_id = self._find_customer(cursor, key_column, key)
+            if customer_id is None:
+                continue
+            if self._is_member(cursor, customer_id):
+                keys[key_column] = None
+                continue
+            if other_key is not None:
+                # Remember the other contact detail if the customer has none and nobody else owns it
+                cursor.execute(f"""
+                    UPDATE CYEAE_CUSTOMER SET {other_column} = ?, {other_column}_KEY = ?
+                    WHERE CUSTOMER_ID = ? AND {other_column}_KEY IS NULL AND COALESCE({other_column}, '') = ''
+                      AND NOT EXISTS (SELECT 1 FROM CYEAE_CUSTOMER WHERE {other_column}_KEY = ?)
+                """, (other_value, other_key, customer_id, other_key))
+            return customer_id
+        return self._insert_customer_row(cursor, name, phone, email, address, customer_type,
+                                         keys['PHONE_KEY'], keys['EMAIL_KEY'])
+
+    def _is_member(self, cursor, customer_id):
+        return cursor.execute("SELECT 1 FROM CYEAE_MEMBER_CUSTOMERS WHERE CUSTOMER_ID = ?",
+                              (customer_id,)).fetchone() is not None
+
+    def _insert_customer(self, cursor, name, phone, email, address, customer_type='regular'):
+        """Insert a customer; a phone/email another customer already owns is stored without its key."""
+        phone_key, email_key = customers.normalize_phone(phone), customers.normalize_email(email)
+        if phone_key is not None and self._find_customer(cursor, 'PHONE_KEY', phone_key) is not None:
+            phone_key = None
+        if email_key is not None and self._find_customer(cursor, 'EMAIL_KEY', email_key) is not None:
+            email_key = None
+        return self._insert_customer_row(cursor, name, phone, email, address, customer_type, phone_key, email_key)
+
+    def _insert_customer_row(self, cursor, name, phone, email, address, customer_type, phone_key, email_key):
         cursor.execute("""
-            INSERT INTO CYEAE_CUSTOMER (NAME, PHONE, EMAIL, ADDRESS, CUSTOMER_TYPE)
-            VALUES (?, ?, ?, ?, ?)
-        """, (name, phone, email, address, customer_type))
-        customer_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+            INSERT INTO CYEAE_CUSTOMER (NAME, PHONE, EMAIL, ADDRESS, CUSTOMER_TYPE, PHONE_KEY, EMAIL_KEY)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (name, phone, email, address, customer_type, phone_key, email_key))
+        return cursor.lastrowid
+
+    def merge_duplicate_customers(self, dry_run=False):
+        """合并重复客户 (一次性清理, see customers.merge_duplicates); dry_run rolls the merge back."""
+        with self.db_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                stats = customers.merge_duplicates(cursor)
+                if dry_run:
+                    conn.rollback()
+                else:
+                    conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        self.customer_cache.invalidate()
+        self.member_cache.invalidate()
+        return stats
+
+    def register_member(self, name, email, password, phone='', address='', date_of_birth=None):
+        """会员注册: a new customer row and its member record, in one transaction.
+
+        Raises CustomerExists if a member already has the email. A walk-in
+        customer with the same email or phone is left as it is, orders
+        included (nothing proves the registrant is that customer); the
+        member only takes over the phone/email keys, so login and walk-in
+        matching find the member from now on.
+        """
+        phone_key, email_key = customers.normalize_phone(phone), customers.normalize_email(email)
+        if email_key is None:
+            raise ValueError("Invalid email address")
+        # Hash outside the write lock: the KDF is the slow part
+        password_hash = self.db_manager.hash_password(password)
+        with self.db_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                keys = {'PHONE_KEY': phone_key, 'EMAIL_KEY': email_key}
+                for key_column, key in list(keys.items()):
+                    if key is None:
+                        continue
+                    owner = self._find_customer(cursor, key_column, key)
+                    if owner is None:
+                        continue
+                    if self._is_member(cursor, owner):
+                        if key_column == 'EMAIL_KEY':
+                            raise CustomerExists("Email already registered")
+                        keys[key_column] = None
+                    else:
+                        cursor.execute(f"UPDATE CYEAE_CUSTOMER SET {key_column} = NULL WHERE CUSTOMER_ID = ?",
+                                       (owner,))
+                        self.customer_cache.invalidate((key_column, key))
+                customer_id = self._insert_customer_row(cursor, name, phone, email, address, 'member',
+                                                        keys['PHONE_KEY'], keys['EMAIL_KEY'])
+                cursor.execute("""
+                    INSERT INTO CYEAE_MEMBER_CUSTOMERS (CUSTOMER_ID, PASSWORD_HASH, DATE_OF_BIRTH)
+                    VALUES (?, ?, ?)
+                """, (customer_id, password_hash, date_of_birth))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        self.member_cache.invalidate(email_key)
         return customer_id
 
     def create_member_customer(self, customer_id, password, date_of_birth=None):
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
-        try:
+        with self.db_manager.connection() as conn:
+            cursor = conn.cursor()
             password_hash = self.db_manager.hash_password(password)
             cursor.execute(
                 """
@@ -188,32 +675,46 @@ class CoffeeShopDB:
                 (customer_id, password_hash, date_of_birth)
             )
             conn.commit()
-        finally:
-            conn.close()
+            self._invalidate_member(cursor, customer_id)
+
+    def _invalidate_member(self, cursor, customer_id):
+        """Drop the cached member row of customer_id; call after any change to the customer or member."""
+        row = cursor.execute("SELECT EMAIL_KEY FROM CYEAE_CUSTOMER WHERE CUSTOMER_ID = ?", (customer_id,)).fetchone()
+        if row and row[0]:
+            self.member_cache.invalidate(row[0])
 
     def get_member_by_email(self, email):
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            SELECT c.CUSTOMER_ID, c.NAME, c.PHONE, c.EMAIL, c.ADDRESS, c.CUSTOMER_TYPE,
-                   m.PASSWORD_HASH, m.DATE_OF_BIRTH, m.REGISTRATION_DATE
-            FROM CYEAE_CUSTOMER c
-            JOIN CYEAE_MEMBER_CUSTOMERS m ON c.CUSTOMER_ID = m.CUSTOMER_ID
-            WHERE c.EMAIL = ?
-            """,
-            (email,)
-        )
-        row = cursor.fetchone()
-        conn.close()
-        return row
+        """Member row by email, compared like EMAIL_KEY (trimmed, case-insensitive)."""
+        email_key = customers.normalize_email(email)
+        if email_key is None:
+            return None
+        with self.db_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT c.CUSTOMER_ID, c.NAME, c.PHONE, c.EMAIL, c.ADDRESS, c.CUSTOMER_TYPE,
+                       m.PASSWORD_HASH, m.DATE_OF_BIRTH, m.REGISTRATION_DATE
+                FROM CYEAE_CUSTOMER c
+                JOIN CYEAE_MEMBER_CUSTOMERS m ON c.CUSTOMER_ID = m.CUSTOMER_ID
+                WHERE c.EMAIL_KEY = ?
+                """,
+                (email_key,)
+            )
+            return cursor.fetchone()
 
     def verify_member_login(self, email, password):
-        member = self.get_member_by_email(email)
-        if not member:
-            return None
+        email_key = customers.normalize_email(email)
+        member = self.member_cache.get(email_key) if email_key else None
+        if member is None:
+            member = self.get_member_by_email(email)
+            if not member:
+                self.db_manager.hasher.verify_dummy(password)
+                return None
+            self.member_cache.put(email_key, member)
         password_hash = member[6]
         if self.db_manager.verify_password(password, password_hash):
+            if self.db_manager.hasher.needs_rehash(password_hash):
+                self._upgrade_password_hash(member[0], password_hash, password)
             return {
                 'customer_id': member[0],
                 'name': member[1],
@@ -225,161 +726,788 @@ class CoffeeShopDB:
                 'registration_date': member[8]
             }
         return None
+
+    def _upgrade_password_hash(self, customer_id, old_hash, password):
+        """Rehash with the current KDF settings (legacy SHA-256 or outdated parameters)."""
+        new_hash = self.db_manager.hash_password(password)
+        with self.db_manager.connection() as conn:
+            cursor = conn.cursor()
+            # Compare-and-set: a concurrent login may already have upgraded it
+            cursor.execute(
+                "UPDATE CYEAE_MEMBER_CUSTOMERS SET PASSWORD_HASH = ? WHERE CUSTOMER_ID = ? AND PASSWORD_HASH = ?",
+                (new_hash, customer_id, old_hash)
+            )
+            conn.commit()
+            self._invalidate_member(cursor, customer_id)
     
     def create_order(self, customer_id, payment_method, order_items):
         """创建订单"""
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
-        
+        with self.db_manager.connection() as conn:
+            cursor = conn.cursor()
+            # 先拿写锁, 避免读锁升级时与其他写入者冲突
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                order_id = self._insert_order(cursor, customer_id, payment_method, order_items)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                raise e
+        self.order_feed.publish()
+        return order_id
+
+    def _parse_order_items(self, order_items):
+        if not order_items:
+            raise OrderValidationError("Order must contain at least one item")
+
+        lines = []
+        for item in order_items:
+            try:
+                product_id = int(item['product_id'])
+                quantity = int(item['quantity'])
+            except (KeyError, TypeError, ValueError):
+                raise OrderValidationError(f"Invalid order item: {item!r}")
+            if quantity <= 0:
+                raise OrderValidationError(f"Invalid quantity for product {product_id}: {quantity}")
+            lines.append((product_id, quantity))
+        return lines
+
+    def _load_products(self, cursor, product_ids):
+        """PRODUCT_ID -> (PRODUCT_ID, PRICE, IS_ACTIVE, STOCK) for the given ids, in as few IN (...) queries as possible.
+
+        STOCK is None for products without a stock count (unlimited).
+        """
+        product_ids = sorted(set(product_ids))
+        products = {}
+        for i in range(0, len(product_ids), IN_CLAUSE_CHUNK):
+            chunk = product_ids[i:i + IN_CLAUSE_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(
+                f"""SELECT p.PRODUCT_ID, p.PRICE, p.IS_ACTIVE, s.QUANTITY
+                    FROM CYEAE_PRODUCT p
+                    LEFT JOIN CYEAE_PRODUCT_STOCK s ON s.PRODUCT_ID = p.PRODUCT_ID
+                    WHERE p.PRODUCT_ID IN ({placeholders})""",
+                chunk
+            )
+            products.update((row[0], row) for row in cursor.fetchall())
+        return products
+
+    def _price_order_items(self, cursor, order_items, products=None):
+        """Price every line with one IN (...) lookup; raise before anything is written.
+
+        Pass products (from _load_products) to price several orders off one lookup.
+        """
+        lines = self._parse_order_items(order_items)
+        product_ids = sorted({product_id for product_id, _ in lines})
+        if products is None:
+            products = self._load_products(cursor, product_ids)
+
+        missing = [pid for pid in product_ids if pid not in products]
+        if missing:
+            raise OrderValidationError(f"Unknown product(s): {', '.join(map(str, missing))}")
+        inactive = [pid for pid in product_ids if products[pid][2] != 'Y']
+        if inactive:
+            raise OrderValidationError(f"Product(s) not available: {', '.join(map(str, inactive))}")
+
+        priced = []
+        total_amount = 0
+        for product_id, quantity in lines:
+            unit_price = products[product_id][1]
+            line_amount = unit_price * quantity
+            total_amount += line_amount
+            priced.append((product_id, quantity, unit_price, line_amount))
+        return priced, total_amount
+
+    def _take_stock(self, cursor, priced, products):
+        """库存检查并扣减 (在调用方的写事务中)
+
+        Products without a stock count are skipped. Raises OutOfStock before
+        writing anything if any stocked product is short; otherwise
+        decrements every stocked product with one guarded UPDATE each and
+        updates products in place, so later orders priced off the same
+        lookup (bulk ingestion) see the reduced counts.
+        """
+        wanted = {}
+        for product_id, quantity, _, _ in priced:
+            if products[product_id][3] is not None:
+                wanted[product_id] = wanted.get(product_id, 0) + quantity
+        if not wanted:
+            return
+        short = [pid for pid, quantity in sorted(wanted.items()) if products[pid][3] < quantity]
+        if short:
+            raise OutOfStock("Out of stock: " + ', '.join(
+                f"product {pid} ({products[pid][3]} left)" for pid in short))
+
+        # The caller holds the write lock, so the guard only catches a stale products lookup
+        cursor.executemany("""
+            UPDATE CYEAE_PRODUCT_STOCK SET QUANTITY = QUANTITY - ?, UPDATED_AT = CURRENT_TIMESTAMP
+            WHERE PRODUCT_ID = ? AND QUANTITY >= ?
+        """, [(quantity, pid, quantity) for pid, quantity in wanted.items()])
+        if cursor.rowcount != len(wanted):
+            raise OutOfStock("Out of stock: stock changed while the order was being placed")
+        for pid, quantity in wanted.items():
+            row = products[pid]
+            products[pid] = row[:3] + (row[3] - quantity,)
+
+    def get_stock_levels(self):
+        """(PRODUCT_ID, product name, QUANTITY, UPDATED_AT) for every product with a stock count."""
+        with self.db_manager.connection() as conn:
+            return conn.execute("""
+                SELECT s.PRODUCT_ID, p.NAME, s.QUANTITY, s.UPDATED_AT
+                FROM CYEAE_PRODUCT_STOCK s
+                JOIN CYEAE_PRODUCT p ON p.PRODUCT_ID = s.PRODUCT_ID
+                ORDER BY p.NAME
+            """).fetchall()
+
+    def set_stock(self, product_id, quantity):
+        """设置库存; quantity 为 None 时取消限量. Returns False for an unknown product."""
+        with self.db_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                if cursor.execute("SELECT 1 FROM CYEAE_PRODUCT WHERE PRODUCT_ID = ?", (product_id,)).fetchone() is None:
+                    conn.rollback()
+                    return False
+                if quantity is None:
+                    cursor.execute("DELETE FROM CYEAE_PRODUCT_STOCK WHERE PRODUCT_ID = ?", (product_id,))
+                else:
+                    cursor.execute("""
+                        INSERT INTO CYEAE_PRODUCT_STOCK (PRODUCT_ID, QUANTITY) VALUES (?, ?)
+                        ON CONFLICT (PRODUCT_ID) DO UPDATE
+                        SET QUANTITY = excluded.QUANTITY, UPDATED_AT = CURRENT_TIMESTAMP
+                    """, (product_id, quantity))
+                conn.commit()
+                return True
+            except Exception:
+                conn.rollback()
+                raise
+
+    def adjust_stock(self, product_id, delta):
+        """按增量调整库存 (进货为正, 报损为负); returns the new count, or None if the product has no stock count."""
+        with self.db_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                row = cursor.execute("""
+                    UPDATE CYEAE_PRODUCT_STOCK SET QUANTITY = MAX(QUANTITY + ?, 0), UPDATED_AT = CURRENT_TIMESTAMP
+                    WHERE PRODUCT_ID = ?
+                    RETURNING QUANTITY
+                """, (delta, product_id)).fetchone()
+                conn.commit()
+                return row[0] if row else None
+            except Exception:
+                conn.rollback()
+                raise
+
+    def _insert_order_header(self, cursor, customer_id, payment_method, total_amount,
+                             order_date=None, client_order_key=None):
+        cursor.execute("""
+            INSERT INTO CYEAE_ORDERS (CUSTOMER_ID, PAYMENT_METHOD, TOTAL_AMOUNT, ORDER_DATE, CLIENT_ORDER_KEY)
+            VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?)
+        """, (customer_id, payment_method, total_amount, order_date, client_order_key))
+        return cursor.lastrowid
+
+    def _insert_order_items(self, cursor, rows):
+        """rows: (ORDER_ID, PRODUCT_ID, QUANTITY, UNIT_PRICE, LINE_AMOUNT) tuples, possibly spanning many orders."""
+        cursor.executemany("""
+            INSERT INTO CYEAE_ORDER_ITEMS (ORDER_ID, PRODUCT_ID, QUANTITY, UNIT_PRICE, LINE_AMOUNT)
+            VALUES (?, ?, ?, ?, ?)
+        """, rows)
+
+    def _insert_order(self, cursor, customer_id, payment_method, order_items):
+        """Write one order inside the caller's transaction and return its id."""
+        products = self._load_products(cursor, [product_id for product_id, _ in self._parse_order_items(order_items)])
+        priced, total_amount = self._price_order_items(cursor, order_items, products)
+        self._take_stock(cursor, priced, products)
+        order_id = self._insert_order_header(cursor, customer_id, payment_method, total_amount)
+        self._insert_order_items(cursor, [(order_id,) + line for line in priced])
+        return order_id
+
+    def create_orders_bulk(self, orders):
+        """批量写入订单 (离线 POS 补传), 全部在一个事务中提交
+
+        Each order is a dict shaped like the POST /api/orders body
+        (customer_id or customer_name/customer_phone/customer_email/
+        customer_address, payment_method, items) plus an optional
+        client_order_key and order_date ('YYYY-MM-DD HH:MM:SS', UTC).
+
+        An order whose client_order_key was already stored, or appears earlier
+        in the same batch, is not written again and reports the original
+        order_id as a duplicate. Invalid orders are reported and skipped
+        without affecting the rest of the batch. Returns one result dict per
+        input order, in input order.
+        """
+        results = [None] * len(orders)
+        keys = {}
+        for index, order in enumerate(orders):
+            key = order.get('client_order_key') if isinstance(order, dict) else None
+            if key is not None:
+                keys.setdefault(str(key), []).append(index)
+
+        with self.db_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                existing = self._find_orders_by_client_key(cursor, list(keys))
+
+                product_ids = []
+                for order in orders:
+                    if isinstance(order, dict):
+                        for item in order.get('items') or []:
+                            if isinstance(item, dict) and str(item.get('product_id', '')).isdigit():
+                                product_ids.append(int(item['product_id']))
+                products = self._load_products(cursor, product_ids)
+
+                item_rows = []
+                for index, order in enumerate(orders):
+                    key = order.get('client_order_key') if isinstance(order, dict) else None
+                    key = str(key) if key is not None else None
+                    result = {'index': index, 'client_order_key': key}
+                    results[index] = result
+
+                    if key is not None and key in existing:
+                        result.update(status='duplicate', order_id=existing[key])
+                        continue
+                    try:
+                        if not isinstance(order, dict):
+                            raise OrderValidationError("Order must be an object")
+                        if not order.get('payment_method'):
+                            raise OrderValidationError("Missing payment_method")
+                        order_date = self._normalize_order_date(order.get('order_date'))
+                        priced, total_amount = self._price_order_items(cursor, order.get('items'), products)
+
+                        customer_id = order.get('customer_id')
+                        if not customer_id and not order.get('customer_name'):
+                            raise OrderValidationError("Missing customer_id or customer_name")
+                        # Last check that can fail: nothing of this order is written before it
+                        self._take_stock(cursor, priced, products)
+                        if not customer_id:
+                            customer_id = self._resolve_customer(
+                                cursor,
+                                order['customer_name'],
+                                order.get('customer_phone', ''),
+                                order.get('customer_email', ''),
+                                order.get('customer_address', '')
+                            )
+
+                        order_id = self._insert_order_header(
+                            cursor, customer_id, order['payment_method'], total_amount, order_date, key
+                        )
+                    except OrderValidationError as e:
+                        result.update(status='error', error=str(e))
+                        continue
+
+                    item_rows.extend((order_id,) + line for line in priced)
+                    result.update(status='created', order_id=order_id)
+                    if key is not None:
+                        existing[key] = order_id
+
+                self._insert_order_items(cursor, item_rows)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        if any(result['status'] == 'created' for result in results):
+            self.order_feed.publish()
+        return results
+
+    def _find_orders_by_client_key(self, cursor, keys):
+        found = {}
+        for i in range(0, len(keys), IN_CLAUSE_CHUNK):
+            chunk = keys[i:i + IN_CLAUSE_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            cursor.execute(
+                f"SELECT CLIENT_ORDER_KEY, ORDER_ID FROM CYEAE_ORDERS WHERE CLIENT_ORDER_KEY IN ({placeholders})",
+                chunk
+            )
+            found.update(cursor.fetchall())
+        return found
+
+    def _normalize_order_date(self, value):
+        if not value:
+            return None
         try:
-            # 计算总金额
-            total_amount = 0
-            for item in order_items:
-                cursor.execute("SELECT PRICE FROM CYEAE_PRODUCT WHERE PRODUCT_ID = ?", (item['product_id'],))
-                price = cursor.fetchone()[0]
-                total_amount += price * item['quantity']
-            
-            # 创建订单
-            cursor.execute("""
-                INSERT INTO CYEAE_ORDERS (CUSTOMER_ID, PAYMENT_METHOD, TOTAL_AMOUNT)
-                VALUES (?, ?, ?)
-            """, (customer_id, payment_method, total_amount))
-            
-            order_id = cursor.lastrowid
+            return datetime.fromisoformat(str(value).replace('Z', '')).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            raise OrderValidationError(f"Invalid order_date: {value!r}")
+
+    def get_order_history(self, customer_id=None):
+        """获取订单历史"""
+        with self.db_manager.read_connection() as conn:
+            cursor = conn.cursor()
             
-            # 添加订单项
-            for item in order_items:
-                cursor.execute("SELECT PRICE FROM CYEAE_PRODUCT WHERE PRODUCT_ID = ?", (item['product_id'],))
-                unit_price = cursor.fetchone()[0]
-                line_amount = unit_price * item['quantity']
-                
+            if customer_id:
                 cursor.execute("""
-                    INSERT INTO CYEAE_ORDER_ITEMS (ORDER_ID, PRODUCT_ID, QUANTITY, UNIT_PRICE, LINE_AMOUNT)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (order_id, item['product_id'], item['quantity'], unit_price, line_amount))
-            
-            conn.commit()
-            return order_id
+                    SELECT o.ORDER_ID, c.NAME, o.ORDER_DATE, o.STATUS, o.PAYMENT_METHOD, o.TOTAL_AMOUNT
+                    FROM CYEAE_ORDERS o
+                    JOIN CYEAE_CUSTOMER c ON o.CUSTOMER_ID = c.CUSTOMER_ID
+                    WHERE o.CUSTOMER_ID = ?
+                    ORDER BY o.ORDER_DATE DESC
+                """, (customer_id,))
+            else:
+                cursor.execute("""
+                    SELECT o.ORDER_ID, c.NAME, o.ORDER_DATE, o.STATUS, o.PAYMENT_METHOD, o.TOTAL_AMOUNT
+                    FROM CYEAE_ORDERS o
+                    JOIN CYEAE_CUSTOMER c ON o.CUSTOMER_ID = c.CUSTOMER_ID
+                    ORDER BY o.ORDER_DATE DESC
+                """)
             
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            conn.close()
+            return cursor.fetchall()
     
-    def get_order_history(self, customer_id=None):
-        """获取订单历史"""
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
-        
+    def get_orders_page(self, limit=50, cursor=None, customer_id=None, status=None,
+                        payment_method=None, start_date=None, end_date=None):
+        """按 (ORDER_DATE, ORDER_ID) 倒序分页获取订单
+
+        Returns (rows, next_cursor); next_cursor is None on the last page.
+        Rows have the same columns as get_order_history.
+        """
+        query = """
+            SELECT o.ORDER_ID, c.NAME, o.ORDER_DATE, o.STATUS, o.PAYMENT_METHOD, o.TOTAL_AMOUNT
+            FROM CYEAE_ORDERS o
+            JOIN CYEAE_CUSTOMER c ON o.CUSTOMER_ID = c.CUSTOMER_ID
+            WHERE 1=1
+        """
+        params = []
         if customer_id:
-            cursor.execute("""
-                SELECT o.ORDER_ID, c.NAME, o.ORDER_DATE, o.STATUS, o.PAYMENT_METHOD, o.TOTAL_AMOUNT
-                FROM CYEAE_ORDERS o
-                JOIN CYEAE_CUSTOMER c ON o.CUSTOMER_ID = c.CUSTOMER_ID
-                WHERE o.CUSTOMER_ID = ?
-                ORDER BY o.ORDER_DATE DESC
-            """, (customer_id,))
-        else:
-            cursor.execute("""
-                SELECT o.ORDER_ID, c.NAME, o.ORDER_DATE, o.STATUS, o.PAYMENT_METHOD, o.TOTAL_AMOUNT
-                FROM CYEAE_ORDERS o
-                JOIN CYEAE_CUSTOMER c ON o.CUSTOMER_ID = c.CUSTOMER_ID
-                ORDER BY o.ORDER_DATE DESC
-            """)
-        
-        orders = cursor.fetchall()
-        conn.close()
-        return orders
-    
+            query += " AND o.CUSTOMER_ID = ?"
+            params.append(customer_id)
+        if status:
+            query += " AND o.STATUS = ?"
+            params.append(status)
+        if payment_method:
+            query += " AND o.PAYMENT_METHOD = ?"
+            params.append(payment_method)
+        if start_date:
+            query += " AND o.ORDER_DATE >= ?"
+            params.append(start_date)
+        if end_date:
+            # end_date is inclusive of the whole day
+            query += " AND o.ORDER_DATE < DATE(?, '+1 day')"
+            params.append(end_date)
+        if cursor:
+            query += " AND (o.ORDER_DATE, o.ORDER_ID) < (?, ?)"
+            params.extend(decode_order_cursor(cursor))
+
+        query += " ORDER BY o.ORDER_DATE DESC, o.ORDER_ID DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self.db_manager.read_connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_order_cursor(rows[-1][2], rows[-1][0])
+        return rows, next_cursor
+
+    def iter_orders_with_items(self, start_date=None, end_date=None, batch_size=1000):
+        """逐个产出 (order_row, item_rows), 用于流式导出
+
+        Reads one joined cursor in fetchmany batches, so memory stays flat
+        however many orders match. Uses its own connection rather than the
+        pool because the caller may hold the generator open for the length
+        of an HTTP download. Order rows are (ORDER_ID, ORDER_DATE, CUSTOMER_ID,
+        customer name, STATUS, PAYMENT_METHOD, TOTAL_AMOUNT); item rows are
+        (PRODUCT_ID, product name, QUANTITY, UNIT_PRICE, LINE_AMOUNT).
+        """
+        query = """
+            SELECT o.ORDER_ID, o.ORDER_DATE, o.CUSTOMER_ID, c.NAME, o.STATUS, o.PAYMENT_METHOD, o.TOTAL_AMOUNT,
+                   oi.PRODUCT_ID, p.NAME, oi.QUANTITY, oi.UNIT_PRICE, oi.LINE_AMOUNT
+            FROM CYEAE_ORDERS o
+            LEFT JOIN CYEAE_CUSTOMER c ON o.CUSTOMER_ID = c.CUSTOMER_ID
+            LEFT JOIN CYEAE_ORDER_ITEMS oi ON oi.ORDER_ID = o.ORDER_ID
+            LEFT JOIN CYEAE_PRODUCT p ON oi.PRODUCT_ID = p.PRODUCT_ID
+            WHERE 1=1
+        """
+        params = []
+        if start_date:
+            query += " AND o.ORDER_DATE >= ?"
+            params.append(start_date)
+        if end_date:
+            query += " AND o.ORDER_DATE < DATE(?, '+1 day')"
+            params.append(end_date)
+        query += " ORDER BY o.ORDER_DATE, o.ORDER_ID"
+
+        conn = self.db_manager.get_read_connection()
+        try:
+            cursor = conn.execute(query, params)
+            order, items = None, []
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    if order is None or row[0] != order[0]:
+                        if order is not None:
+                            yield order, items
+                        order, items = row[:7], []
+                    if row[7] is not None:
+                        items.append(row[7:])
+            if order is not None:
+                yield order, items
+        finally:
+            conn.close()
+
     def get_order_details(self, order_id):
         """获取订单详情"""
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT oi.PRODUCT_ID, p.NAME, oi.QUANTITY, oi.UNIT_PRICE, oi.LINE_AMOUNT
-            FROM CYEAE_ORDER_ITEMS oi
-            JOIN CYEAE_PRODUCT p ON oi.PRODUCT_ID = p.PRODUCT_ID
-            WHERE oi.ORDER_ID = ?
-        """, (order_id,))
-        
-        items = cursor.fetchall()
-        conn.close()
+        with self.db_manager.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT oi.PRODUCT_ID, p.NAME, oi.QUANTITY, oi.UNIT_PRICE, oi.LINE_AMOUNT
+                FROM CYEAE_ORDER_ITEMS oi
+                JOIN CYEAE_PRODUCT p ON oi.PRODUCT_ID = p.PRODUCT_ID
+                WHERE oi.ORDER_ID = ?
+            """, (order_id,))
+            
+            return cursor.fetchall()
+
+    def _load_order_items(self, conn, order_ids):
+        """ORDER_ID -> [(PRODUCT_ID, product name, QUANTITY, UNIT_PRICE, LINE_AMOUNT), ...], one IN (...) query per chunk."""
+        order_ids = sorted(set(order_ids))
+        items = {}
+        for i in range(0, len(order_ids), IN_CLAUSE_CHUNK):
+            chunk = order_ids[i:i + IN_CLAUSE_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            rows = conn.execute(f"""
+                SELECT oi.ORDER_ID, oi.PRODUCT_ID, p.NAME, oi.QUANTITY, oi.UNIT_PRICE, oi.LINE_AMOUNT
+                FROM CYEAE_ORDER_ITEMS oi
+                JOIN CYEAE_PRODUCT p ON oi.PRODUCT_ID = p.PRODUCT_ID
+                WHERE oi.ORDER_ID IN ({placeholders})
+                ORDER BY oi.ORDER_ID
+            """, chunk)
+            for row in rows:
+                items.setdefault(row[0], []).append(row[1:])
         return items
+
+    def get_order_items(self, order_ids):
+        """批量获取订单明细: ORDER_ID -> item rows (as get_order_details) for many orders at once."""
+        with self.db_manager.connection() as conn:
+            return self._load_order_items(conn, order_ids)
+
+    def get_orders_with_items(self, order_ids):
+        """批量订单详情: (order_row, item_rows) for every existing id, in the order given.
+
+        order_row has the columns of get_orders_page(). Headers and items are
+        read with one IN (...) query each per chunk of ids, instead of one
+        details call per order.
+        """
+        order_ids = list(dict.fromkeys(order_ids))
+        headers = {}
+        with self.db_manager.connection() as conn:
+            for i in range(0, len(order_ids), IN_CLAUSE_CHUNK):
+                chunk = order_ids[i:i + IN_CLAUSE_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute(f"""
+                    SELECT o.ORDER_ID, c.NAME, o.ORDER_DATE, o.STATUS, o.PAYMENT_METHOD, o.TOTAL_AMOUNT
+                    FROM CYEAE_ORDERS o
+                    LEFT JOIN CYEAE_CUSTOMER c ON o.CUSTOMER_ID = c.CUSTOMER_ID
+                    WHERE o.ORDER_ID IN ({placeholders})
+                """, chunk)
+                headers.update((row[0], row) for row in rows)
+            items = self._load_order_items(conn, list(headers))
+        return [(headers[order_id], items.get(order_id, [])) for order_id in order_ids if order_id in headers]
+
+    def update_order_status(self, order_id, status):
+        """推进订单状态; returns (previous status, CHANGED_AT), or None for an unknown order.
+
+        Raises InvalidStatusTransition unless status is a next step of the
+        current one (ORDER_STATUS_TRANSITIONS). Cancelling an order puts its
+        items back into stock.
+        """
+        if status not in ORDER_STATUS_TRANSITIONS:
+            raise OrderValidationError(f"Unknown status: {status}")
+        with self.db_manager.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                row = cursor.execute("SELECT STATUS FROM CYEAE_ORDERS WHERE ORDER_ID = ?", (order_id,)).fetchone()
+                if row is None:
+                    conn.rollback()
+                    return None
+                previous = row[0]
+                if status not in ORDER_STATUS_TRANSITIONS.get(previous, ()):
+                    raise InvalidStatusTransition(f"Order {order_id} is {previous}, it cannot become {status}")
+                cursor.execute("UPDATE CYEAE_ORDERS SET STATUS = ? WHERE ORDER_ID = ?", (status, order_id))
+                changed_at = cursor.execute("""
+                    INSERT INTO CYEAE_ORDER_STATUS_HISTORY (ORDER_ID, FROM_STATUS, STATUS) VALUES (?, ?, ?)
+                    RETURNING CHANGED_AT
+                """, (order_id, previous, status)).fetchone()[0]
+                if status == 'cancelled':
+                    cursor.execute("""
+                        UPDATE CYEAE_PRODUCT_STOCK SET UPDATED_AT = CURRENT_TIMESTAMP, QUANTITY = QUANTITY + (
+                            SELECT SUM(oi.QUANTITY) FROM CYEAE_ORDER_ITEMS oi
+                            WHERE oi.ORDER_ID = ? AND oi.PRODUCT_ID = CYEAE_PRODUCT_STOCK.PRODUCT_ID
+                        )
+                        WHERE PRODUCT_ID IN (SELECT PRODUCT_ID FROM CYEAE_ORDER_ITEMS WHERE ORDER_ID = ?)
+                    """, (order_id, order_id))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        self.order_feed.publish_status(order_id, status, previous_status=previous, changed_at=changed_at)
+        return previous, changed_at
+
+    def get_order_status_history(self, order_id):
+        """(FROM_STATUS, STATUS, CHANGED_AT) rows of an order, oldest first."""
+        with self.db_manager.connection() as conn:
+            return conn.execute("""
+                SELECT FROM_STATUS, STATUS, CHANGED_AT FROM CYEAE_ORDER_STATUS_HISTORY
+                WHERE ORDER_ID = ?
+                ORDER BY HISTORY_ID
+            """, (order_id,)).fetchall()
+
+    def get_kitchen_queue(self, limit=20, statuses=OPEN_STATUSES):
+        """后厨队列: 最早的 limit 个未完成订单及其明细, as (order_row, item_rows) pairs."""
+        with self.db_manager.connection() as conn:
+            return self.kitchen_queue.next(conn, limit, statuses)
     
+    def get_dashboard_summary(self, today=None):
+        """管理后台首页指标: 今日销售额/订单数/客单价, 客户总数, 以及近两周趋势
+
+        One statement: a range scan of the last DASHBOARD_DAYS days of orders
+        on idx_orders_date grouped by day, plus the customer count. Dates are
+        UTC days, like ORDER_DATE. The result is reused for DASHBOARD_TTL
+        seconds.
+        """
+        today = today or datetime.utcnow().date()
+        now = time.monotonic()
+        with self._dashboard_lock:
+            if self._dashboard and self._dashboard[0] == today and now - self._dashboard[1] < DASHBOARD_TTL:
+                return self._dashboard[2]
+
+        start = today - timedelta(days=DASHBOARD_DAYS - 1)
+        with self.db_manager.read_connection() as conn:
+            rows = conn.execute("""
+                SELECT DATE(ORDER_DATE) AS day, COUNT(*), TOTAL(TOTAL_AMOUNT), COUNT(TOTAL_AMOUNT)
+                FROM CYEAE_ORDERS
+                WHERE ORDER_DATE >= ? AND ORDER_DATE < ? AND STATUS IS NOT 'cancelled'
+                GROUP BY day
+                UNION ALL
+                -- the row without a day carries the customer count
+                SELECT NULL, COUNT(*), NULL, NULL FROM CYEAE_CUSTOMER
+            """, (start.isoformat(), (today + timedelta(days=1)).isoformat())).fetchall()
+
+        total_customers = 0
+        by_day = {}
+        for day, orders, sales, priced in rows:
+            if day is None:
+                total_customers = orders
+            else:
+                by_day[day] = (orders, sales, priced)
+
+        def window(first, days):
+            orders = sales = priced = 0
+            for i in range(days):
+                day_orders, day_sales, day_priced = by_day.get((first + timedelta(days=i)).isoformat(), (0, 0.0, 0))
+                orders, sales, priced = orders + day_orders, sales + day_sales, priced + day_priced
+            return {'order_count': orders, 'total_sales': sales, 'avg_order_value': sales / priced if priced else 0}
+
+        def change(current, previous):
+            return (current - previous) / previous if previous else None
+
+        summary = {
+            'date': today.isoformat(),
+            'today': window(today, 1),
+            'yesterday': window(today - timedelta(days=1), 1),
+            'last_7_days': window(today - timedelta(days=6), 7),
+            'previous_7_days': window(start, 7),
+            'total_customers': total_customers,
+            'daily': [],
+        }
+        for i in range(DASHBOARD_DAYS):
+            day = start + timedelta(days=i)
+            summary['daily'].append(dict(window(day, 1), date=day.isoformat()))
+        summary['trend'] = {
+            'sales_vs_yesterday': change(summary['today']['total_sales'], summary['yesterday']['total_sales']),
+            'orders_vs_yesterday': change(summary['today']['order_count'], summary['yesterday']['order_count']),
+            'sales_week_over_week': change(summary['last_7_days']['total_sales'],
+                                           summary['previous_7_days']['total_sales']),
+            'orders_week_over_week': change(summary['last_7_days']['order_count'],
+                                            summary['previous_7_days']['order_count']),
+        }
+
+        with self._dashboard_lock:
+            self._dashboard = (today, time.monotonic(), summary)
+        return summary
+
     def get_sales_report(self, start_date=None, end_date=None):
-        """获取销售报告"""
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
-        
+        """获取销售报告 (读取每日汇总表)"""
+        if self.analytics is not None:
+            try:
+                return self.analytics.get_sales_report(start_date, end_date)
+            except ValueError:
+                # 快照只认 YYYY-MM-DD; 其他写法照旧按字符串比较交给 SQL
+                pass
         base_query = """
-            SELECT 
-                DATE(o.ORDER_DATE) as order_date,
-                COUNT(o.ORDER_ID) as order_count,
-                SUM(o.TOTAL_AMOUNT) as total_sales,
-                AVG(o.TOTAL_AMOUNT) as avg_order_value
-            FROM CYEAE_ORDERS o
+            SELECT
+                SALES_DATE as order_date,
+                SUM(ORDER_COUNT) as order_count,
+                CASE WHEN SUM(AMOUNT_COUNT) > 0 THEN SUM(TOTAL_SALES) END as total_sales,
+                CASE WHEN SUM(AMOUNT_COUNT) > 0 THEN SUM(TOTAL_SALES) * 1.0 / SUM(AMOUNT_COUNT) END as avg_order_value
+            FROM CYEAE_DAILY_SALES
             WHERE 1=1
         """
-        
+
         params = []
         if start_date:
-            base_query += " AND DATE(o.ORDER_DATE) >= ?"
+            base_query += " AND SALES_DATE >= ?"
             params.append(start_date)
         if end_date:
-            base_query += " AND DATE(o.ORDER_DATE) <= ?"
+            base_query += " AND SALES_DATE <= ?"
             params.append(end_date)
-            
-        base_query += " GROUP BY DATE(o.ORDER_DATE) ORDER BY order_date DESC"
-        
-        cursor.execute(base_query, params)
-        report = cursor.fetchall()
-        conn.close()
-        return report
-    
+
+        base_query += " GROUP BY SALES_DATE HAVING SUM(ORDER_COUNT) > 0 ORDER BY order_date DESC"
+
+        with self.db_manager.read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(base_query, params)
+            return cursor.fetchall()
+
+    def get_sales_buckets(self, bucket='day', start_date=None, end_date=None, group_by=()):
+        """按时间桶 (hour/day/week/month) 汇总销售, 可按产品/分类/支付方式/客户类型分组
+
+        start_date and end_date are inclusive 'YYYY-MM-DD' days (default: the
+        last 30 days). Returns (columns, rows) ordered by bucket, then by the
+        group-by columns. Buckets before the current one are cached until
+        orders in their range change; the rest for a few seconds.
+        """
+        group_by = tuple(dict.fromkeys(group_by))
+        unknown = [name for name in group_by if name not in sales_buckets.DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Unknown group_by dimension(s): {', '.join(unknown)}")
+        start, end = sales_buckets.resolve_range(bucket, start_date, end_date)
+        now = datetime.utcnow()
+        cutoff = min(sales_buckets.bucket_start(bucket, now), sales_buckets.bucket_start('day', now))
+        cutoff = max(start, min(cutoff, end))
+
+        fmt = '%Y-%m-%d %H:%M:%S'
+        columns = sales_buckets.compile_sales_query(bucket, group_by, start.strftime(fmt), end.strftime(fmt))[2]
+        rows = []
+        with self.db_manager.read_connection() as conn:
+            for lo, hi, closed in ((start, cutoff, True), (cutoff, end, False)):
+                if hi <= lo:
+                    continue
+                token = self._closed_sales_token(conn, lo, hi) if closed else None
+                key = (bucket, group_by, lo, hi, closed)
+                part = self.sales_cache.get(key, token)
+                if part is None:
+                    sql, params, _ = sales_buckets.compile_sales_query(bucket, group_by, lo.strftime(fmt), hi.strftime(fmt))
+                    part = conn.execute(sql, params).fetchall()
+                    self.sales_cache.put(key, part, token)
+                rows.extend(part)
+        return columns, rows
+
+    def _closed_sales_token(self, conn, start, end):
+        """Changes whenever orders dated in [start, end) are added, edited or deleted, or the catalog changes.
+
+        A customer's CUSTOMER_TYPE changing also bumps the order change version (migration 12).
+        """
+        return conn.execute("""
+            SELECT
+                (SELECT VERSION FROM CYEAE_ORDER_CHANGE_VERSION WHERE ID = 1),
+                (SELECT VERSION FROM CYEAE_CATALOG_VERSION WHERE ID = 1),
+                COALESCE(SUM(ORDER_COUNT), 0), TOTAL(TOTAL_SALES)
+            FROM CYEAE_DAILY_SALES
+            WHERE SALES_DATE >= ? AND SALES_DATE < ?
+        """, (start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))).fetchone()
+
     def get_product_sales_report(self):
         """获取产品销售报告"""
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT 
-                p.NAME as product_name,
-                c.CATEGORY_NAME,
-                SUM(oi.QUANTITY) as total_quantity,
-                SUM(oi.LINE_AMOUNT) as total_revenue,
-                COUNT(DISTINCT oi.ORDER_ID) as order_count
-            FROM CYEAE_ORDER_ITEMS oi
-            JOIN CYEAE_PRODUCT p ON oi.PRODUCT_ID = p.PRODUCT_ID
-            JOIN CYEAE_CATEGORY c ON p.CATEGORY_ID = c.CATEGORY_ID
-            GROUP BY p.PRODUCT_ID, p.NAME, c.CATEGORY_NAME
-            ORDER BY total_revenue DESC
-        """)
-        
-        report = cursor.fetchall()
-        conn.close()
-        return report
+        if self.analytics is not None:
+            return self.analytics.get_product_sales_report()
+        with self.db_manager.read_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT 
+                    p.NAME as product_name,
+                    c.CATEGORY_NAME,
+                    SUM(oi.QUANTITY) as total_quantity,
+                    SUM(oi.LINE_AMOUNT) as total_revenue,
+                    COUNT(DISTINCT oi.ORDER_ID) as order_count
+                FROM CYEAE_ORDER_ITEMS oi
+                JOIN CYEAE_PRODUCT p ON oi.PRODUCT_ID = p.PRODUCT_ID
+                JOIN CYEAE_CATEGORY c ON p.CATEGORY_ID = c.CATEGORY_ID
+                LEFT JOIN CYEAE_ORDERS o ON o.ORDER_ID = oi.ORDER_ID
+                WHERE o.STATUS IS NOT 'cancelled'
+                GROUP BY p.PRODUCT_ID, p.NAME, c.CATEGORY_NAME
+                ORDER BY total_revenue DESC
+            """)
+            
+            return cursor.fetchall()
     
     def get_customer_report(self):
         """获取客户报告"""
-        conn = self.db_manager.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT 
-                c.NAME as customer_name,
-                c.CUSTOMER_TYPE,
-                COUNT(o.ORDER_ID) as order_count,
-                SUM(o.TOTAL_AMOUNT) as total_spent,
-                AVG(o.TOTAL_AMOUNT) as avg_order_value,
-                MAX(o.ORDER_DATE) as last_order_date
-            FROM CYEAE_CUSTOMER c
-            LEFT JOIN CYEAE_ORDERS o ON c.CUSTOMER_ID = o.CUSTOMER_ID
-            GROUP BY c.CUSTOMER_ID, c.NAME, c.CUSTOMER_TYPE
-            ORDER BY total_spent DESC
-        """)
-        
-        report = cursor.fetchall()
-        conn.close()
-        return report
\ No newline at end of file
+        if self.analytics is not None:
+            return self.analytics.get_customer_report()
+        with self.db_manager.read_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT 
+                    c.NAME as customer_name,
+                    c.CUSTOMER_TYPE,
+                    COUNT(o.ORDER_ID) as order_count,
+                    SUM(o.TOTAL_AMOUNT) as total_spent,
+                    AVG(o.TOTAL_AMOUNT) as avg_order_value,
+                    MAX(o.ORDER_DATE) as last_order_date
+                FROM CYEAE_CUSTOMER c
+                LEFT JOIN CYEAE_ORDERS o ON c.CUSTOMER_ID = o.CUSTOMER_ID AND o.STATUS IS NOT 'cancelled'
+                GROUP BY c.CUSTOMER_ID, c.NAME, c.CUSTOMER_TYPE
+                ORDER BY total_spent DESC
+            """)
+            
+            return cursor.fetchall()
+
+    def explain_queries(self):
+        """EXPLAIN QUERY PLAN for every read query this class issues.
+
+        Each read method is run once with representative arguments while the
+        connection's trace callback records the SQL it sends; returns a list
+        of (method, sql, plan_lines).
+        """
+        probes = [
+            ('get_all_products', lambda: self.get_all_products()),
+            ('get_categories', lambda: self.get_categories()),
+            ('get_catalog_version', lambda: self.get_catalog_version()),
+            ('get_member_by_email', lambda: self.get_member_by_email('sarah@example.com')),
+            ('get_order_history', lambda: self.get_order_history()),
+            ('get_order_history(customer_id)', lambda: self.get_order_history(1)),
+            ('get_orders_page', lambda: self.get_orders_page(
+                cursor=encode_order_cursor('2099-01-01 00:00:00', 0), start_date='2024-01-01')),
+            ('get_orders_page(customer_id)', lambda: self.get_orders_page(customer_id=1)),
+            ('get_order_details', lambda: self.get_order_details(1)),
+            ('get_orders_with_items', lambda: self.get_orders_with_items([1, 2, 3])),
+            ('get_order_status_history', lambda: self.get_order_status_history(1)),
+            ('get_kitchen_queue', lambda: self.get_kitchen_queue()),
+            ('get_sales_report', lambda: self.get_sales_report('2024-01-01', '2024-12-31')),
+            ('get_dashboard_summary', lambda: self.get_dashboard_summary(date(2099, 1, 1))),
+            ('get_sales_buckets', lambda: self.get_sales_buckets('week', '2024-01-01', '2024-03-31')),
+            ('get_sales_buckets(product)', lambda: self.get_sales_buckets(
+                'day', '2024-01-01', '2024-01-31', ('category', 'product'))),
+            ('get_product_sales_report', lambda: self.get_product_sales_report()),
+            ('get_customer_report', lambda: self.get_customer_report()),
+        ]
+
+        results = []
+        with self.db_manager.connection() as conn:
+            def price_lookup():
+                self._price_order_items(conn.cursor(), [{'product_id': 1, 'quantity': 1}])
+            probes.append(('create_order (pricing)', price_lookup))
+            probes.append(('kitchen queue stats', lambda: self.kitchen_queue.stats()))
+
+            for name, probe in probes:
+                statements = []
+                conn.set_trace_callback(statements.append)
+                try:
+                    probe()
+                except OrderValidationError:
+                    pass
+                finally:
+                    conn.set_trace_callback(None)
+                for sql in statements:
+                    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+                        continue
+                    plan = conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+                    results.append((name, ' '.join(sql.split()), [row[3] for row in plan]))
+        return results
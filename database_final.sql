@@ -121,15 +121,18 @@ INSERT INTO CYEAE_MEMBER_CUSTOMERS (CUSTOMER_ID, PASSWORD_HASH, DATE_OF_BIRTH) V
 -- INDEXES FOR PERFORMANCE
 -- ============================================================================
 
--- Create indexes on foreign keys for better performance
-CREATE INDEX idx_orders_customer_id ON CYEAE_ORDERS(CUSTOMER_ID);
-CREATE INDEX idx_order_items_order_id ON CYEAE_ORDER_ITEMS(ORDER_ID);
-CREATE INDEX idx_order_items_product_id ON CYEAE_ORDER_ITEMS(PRODUCT_ID);
+-- Mirrors migration 3 in migrations.py, which creates the same indexes on existing databases
+-- (CUSTOMER_ID, ORDER_DATE) also serves plain CUSTOMER_ID lookups
+CREATE INDEX idx_orders_customer_date ON CYEAE_ORDERS(CUSTOMER_ID, ORDER_DATE);
+CREATE INDEX idx_orders_date ON CYEAE_ORDERS(ORDER_DATE);
+
+-- Covering indexes for order details and the product sales report
+CREATE INDEX idx_order_items_order_id ON CYEAE_ORDER_ITEMS(ORDER_ID, PRODUCT_ID, QUANTITY, UNIT_PRICE, LINE_AMOUNT);
+CREATE INDEX idx_order_items_product_id ON CYEAE_ORDER_ITEMS(PRODUCT_ID, ORDER_ID, QUANTITY, LINE_AMOUNT);
 CREATE INDEX idx_product_category_id ON CYEAE_PRODUCT(CATEGORY_ID);
 
 -- Create indexes on frequently queried columns
 CREATE INDEX idx_customer_email ON CYEAE_CUSTOMER(EMAIL);
-CREATE INDEX idx_orders_date ON CYEAE_ORDERS(ORDER_DATE);
 CREATE INDEX idx_product_active ON CYEAE_PRODUCT(IS_ACTIVE);
 
 -- ============================================================================
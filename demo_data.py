@@ -9,26 +9,43 @@ from database import CoffeeShopDB
 from datetime import datetime, timedelta
 import random
 
+# Demo customers with English names
+DEMO_CUSTOMERS = [
+    ('Alice Johnson', '13912345678', 'alice@example.com', 'Kowloon', 'regular'),
+    ('Bob Smith', '13823456789', 'bob@example.com', 'Hong Kong Island', 'member'),
+    ('Carol Davis', '13734567890', 'carol@example.com', 'New Territories', 'regular'),
+    ('David Wilson', '13645678901', 'david@example.com', 'Kowloon', 'member'),
+    ('Emma Brown', '13556789012', 'emma@example.com', 'Hong Kong Island', 'regular'),
+    ('Frank Miller', '13467890123', 'frank@example.com', 'New Territories', 'regular'),
+    ('Grace Lee', '13378901234', 'grace@example.com', 'Kowloon', 'member'),
+    ('Henry Taylor', '13289012345', 'henry@example.com', 'Hong Kong Island', 'regular'),
+]
+
+PAYMENT_METHODS = ['cash', 'card', 'alipay', 'wechat']
+
+def random_order_items(product_ids, rng=random):
+    """1-5 random lines with distinct products and quantities 1-3"""
+    order_items = []
+    for _ in range(rng.randint(1, 5)):
+        product_id = rng.choice(product_ids)
+        quantity = rng.randint(1, 3)
+        
+        # Avoid duplicate products
+        if not any(item['product_id'] == product_id for item in order_items):
+            order_items.append({
+                'product_id': product_id,
+                'quantity': quantity
+            })
+    return order_items
+
 def generate_demo_data():
     """Generate demo data with English names and proper formatting"""
     db = CoffeeShopDB()
     
     print("🎭 Generating demo data...")
     
-    # Create more customers with English names
-    customers = [
-        ('Alice Johnson', '13912345678', 'alice@example.com', 'Kowloon', 'regular'),
-        ('Bob Smith', '13823456789', 'bob@example.com', 'Hong Kong Island', 'member'),
-        ('Carol Davis', '13734567890', 'carol@example.com', 'New Territories', 'regular'),
-        ('David Wilson', '13645678901', 'david@example.com', 'Kowloon', 'member'),
-        ('Emma Brown', '13556789012', 'emma@example.com', 'Hong Kong Island', 'regular'),
-        ('Frank Miller', '13467890123', 'frank@example.com', 'New Territories', 'regular'),
-        ('Grace Lee', '13378901234', 'grace@example.com', 'Kowloon', 'member'),
-        ('Henry Taylor', '13289012345', 'henry@example.com', 'Hong Kong Island', 'regular'),
-    ]
-    
     customer_ids = []
-    for customer in customers:
+    for customer in DEMO_CUSTOMERS:
         try:
             customer_id = db.create_customer(*customer)
             customer_ids.append(customer_id)
@@ -42,8 +59,6 @@ def generate_demo_data():
     
     # Generate historical orders (past 30 days)
     print("\n📦 Generating historical orders...")
-    payment_methods = ['cash', 'card', 'alipay', 'wechat']
-    
     for i in range(50):  # Generate 50 orders
         # Random date (within past 30 days)
         days_ago = random.randint(0, 30)
@@ -53,34 +68,20 @@ def generate_demo_data():
         customer_id = random.choice(customer_ids + [1, 2, 3])  # Include existing customers
         
         # Random order items
-        num_items = random.randint(1, 5)
-        order_items = []
-        
-        for _ in range(num_items):
-            product_id = random.choice(product_ids)
-            quantity = random.randint(1, 3)
-            
-            # Avoid duplicate products
-            if not any(item['product_id'] == product_id for item in order_items):
-                order_items.append({
-                    'product_id': product_id,
-                    'quantity': quantity
-                })
+        order_items = random_order_items(product_ids)
         
         if order_items:  # Ensure we have order items
             try:
-                payment_method = random.choice(payment_methods)
+                payment_method = random.choice(PAYMENT_METHODS)
                 order_id = db.create_order(customer_id, payment_method, order_items)
                 
                 # Update order date (simulate historical orders)
-                conn = db.db_manager.get_connection()
-                cursor = conn.cursor()
-                cursor.execute(
-                    "UPDATE CYEAE_ORDERS SET ORDER_DATE = ? WHERE ORDER_ID = ?",
-                    (order_date.strftime('%Y-%m-%d %H:%M:%S'), order_id)
-                )
-                conn.commit()
-                conn.close()
+                with db.db_manager.connection() as conn:
+                    conn.execute(
+                        "UPDATE CYEAE_ORDERS SET ORDER_DATE = ? WHERE ORDER_ID = ?",
+                        (order_date.strftime('%Y-%m-%d %H:%M:%S'), order_id)
+                    )
+                    conn.commit()
                 
                 print(f"✅ Created order #{order_id} ({order_date.strftime('%Y-%m-%d')})")
                 
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Order Export - stream orders with their line items as CSV or NDJSON
+
+Used by the /api/orders/export endpoint and runnable on its own:
+    python export_orders.py --format csv --start-date 2024-01-01 --output orders.csv
+"""
+
+import argparse
+import csv
+import io
+import json
+import sys
+
+from database import CoffeeShopDB
+
+CSV_COLUMNS = [
+    'order_id', 'order_date', 'customer_id', 'customer_name', 'status', 'payment_method', 'total_amount',
+    'product_id', 'product_name', 'quantity', 'unit_price', 'line_amount'
+]
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _number(value):
+    return float(value) if value is not None else None
+
+
+def iter_csv(orders, rows_per_chunk=500):
+    """One CSV line per order item (orders without items get one line), yielded in chunks"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    pending = 0
+    for order, items in orders:
+        order_fields = list(order[:6]) + [_number(order[6])]
+        for item in items or [(None,) * 5]:
+            writer.writerow(order_fields + [item[0], item[1], item[2], _number(item[3]), _number(item[4])])
+            pending += 1
+        if pending >= rows_per_chunk:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_ndjson(orders):
+    """One JSON object per order with its items nested"""
+    for order, items in orders:
+        yield json.dumps({
+            'order_id': order[0],
+            'order_date': order[1],
+            'customer_id': order[2],
+            'customer_name': order[3],
+            'status': order[4],
+            'payment_method': order[5],
+            'total_amount': _number(order[6]),
+            'items': [{
+                'product_id': item[0],
+                'product_name': item[1],
+                'quantity': item[2],
+                'unit_price': _number(item[3]),
+                'line_amount': _number(item[4])
+            } for item in items]
+        }, separators=(',', ':')) + '\n'
+
+
+def iter_export(db, fmt='csv', start_date=None, end_date=None):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    orders = db.iter_orders_with_items(start_date, end_date)
+    return iter_csv(orders) if fmt == 'csv' else iter_ndjson(orders)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export orders with line items')
+    parser.add_argument('--db', default='coffee_shop.db', help='SQLite database file')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+    parser.add_argument('--start-date', help='First order date to include (YYYY-MM-DD)')
+    parser.add_argument('--end-date', help='Last order date to include (YYYY-MM-DD)')
+    parser.add_argument('--output', help='Output file (default: stdout)')
+    args = parser.parse_args()
+
+    db = CoffeeShopDB(args.db)
+    out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for chunk in iter_export(db, args.format, args.start_date, args.end_date):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+JSON serialization of query results
+
+The API handlers used to turn every result tuple into a dict in a Python
+loop and pass the list to jsonify. RowSerializer writes the rows straight to
+JSON bytes from a field list prepared once per endpoint:
+
+- with orjson installed, rows are zipped with the field names and encoded
+  by orjson
+- otherwise each column is encoded with one C-level map() call (the json
+  module's string escaper, int/float repr) and the row objects are filled
+  into a prebuilt '{"name":%s,...}' template, so no per-row Python code runs
+
+Converters (e.g. float, float_or_zero) are applied a column at a time
+before encoding. dumps() is the matching encoder for everything else.
+"""
+
+import json
+from json.encoder import encode_basestring
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_stdlib_encode = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False).encode
+
+
+def dumps(value):
+    """Compact JSON bytes for any JSON-serializable value."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return _stdlib_encode(value).encode('utf-8')
+
+
+def float_or_zero(value):
+    """The handlers' `float(x) if x else 0`: NULL and zero both become 0."""
+    return float(value) if value else 0
+
+
+def or_zero(value):
+    """The handlers' `x if x else 0`."""
+    return value if value else 0
+
+
+def _null(value):
+    return 'null'
+
+
+_ENCODERS = {
+    int: int.__repr__,
+    float: float.__repr__,
+    str: encode_basestring,
+    type(None): _null,
+}
+
+
+def _encode_value(value):
+    encoder = _ENCODERS.get(type(value))
+    return encoder(value) if encoder is not None else _stdlib_encode(value)
+
+
+def _column_encoder(values):
+    """A C-level encoder when the whole column has one plain type, else the generic one."""
+    types = set(map(type, values))
+    if len(types) == 1:
+        return _ENCODERS.get(types.pop(), _encode_value)
+    return _encode_value
+
+
+class RowSerializer:
+    """Encodes result tuples as a JSON array of objects.
+
+    fields are column names, or (name, converter) pairs, in row order.
+    """
+
+    def __init__(self, *fields):
+        fields = [(field, None) if isinstance(field, str) else field for field in fields]
+        self.names = tuple(name for name, _ in fields)
+        self.converters = tuple(converter for _, converter in fields)
+        self._template = '{' + ','.join(
+            encode_basestring(name).replace('%', '%%') + ':%s' for name in self.names
+        ) + '}'
+
+    def _columns(self, rows):
+        columns = list(zip(*rows))
+        for i, converter in enumerate(self.converters):
+            if converter is not None and i < len(columns):
+                columns[i] = tuple(map(converter, columns[i]))
+        return columns
+
+    def encode(self, rows):
+        """JSON bytes of rows as a list of objects."""
+        if not rows:
+            return b'[]'
+        columns = self._columns(rows)
+        if orjson is not None:
+            names = [self.names] * len(rows)
+            return orjson.dumps(list(map(dict, map(zip, names, zip(*columns)))))
+        encoded = [map(_column_encoder(column), column) for column in columns]
+        return ('[' + ','.join(map(self._template.__mod__, zip(*encoded))) + ']').encode('utf-8')
+
+    def to_dicts(self, rows):
+        """The same rows as a list of dicts, for callers that still need Python objects."""
+        if not rows:
+            return []
+        return [dict(zip(self.names, row)) for row in zip(*self._columns(rows))]
+
+
+def envelope(rows_json, **fields):
+    """b'{"success":true,"data":<rows_json>,...}' with the extra fields encoded by dumps()."""
+    parts = [b'{"success":true,"data":', rows_json]
+    for name, value in fields.items():
+        parts += [b',', dumps(name), b':', dumps(value)]
+    parts.append(b'}')
+    return b''.join(parts)
@@ -0,0 +1,58 @@
+"""
+Kitchen queue: open orders in the order they were placed
+
+Open orders (pending, preparing, ready) are covered by the partial index
+idx_orders_open (migration 7), so reading them costs the size of the
+backlog, not of the order history. KitchenQueue reads that index on every
+call instead of keeping the queue in memory: with several worker processes
+a status changed by one worker would otherwise stay stale in the others.
+
+next() takes the first open orders in ORDER_ID order from the index and
+reads their line items with one batched query; stats() counts the open
+orders per status from the same index.
+"""
+
+OPEN_STATUSES = ('pending', 'preparing', 'ready')
+
+# Same predicate as idx_orders_open; SQLite only uses a partial index for
+# queries whose WHERE contains it
+OPEN_FILTER = "STATUS IN ('pending', 'preparing', 'ready')"
+# Pinned: with stale sqlite_stat1 rows the planner prefers scanning idx_orders_date
+OPEN_INDEX = "INDEXED BY idx_orders_open"
+
+
+class KitchenQueue:
+    def __init__(self, db):
+        self.db = db
+
+    def next(self, conn, limit=20, statuses=OPEN_STATUSES):
+        """The first limit open orders with a status in statuses, oldest first.
+
+        Returns a list of (order_row, item_rows); order_row is (ORDER_ID,
+        customer name, ORDER_DATE, STATUS, PAYMENT_METHOD, TOTAL_AMOUNT).
+        """
+        statuses = [status for status in statuses if status in OPEN_STATUSES]
+        if not statuses or limit <= 0:
+            return []
+        placeholders = ','.join('?' * len(statuses))
+        orders = conn.execute(f"""
+            SELECT o.ORDER_ID, c.NAME, o.ORDER_DATE, o.STATUS, o.PAYMENT_METHOD, o.TOTAL_AMOUNT
+            FROM CYEAE_ORDERS o {OPEN_INDEX}
+            LEFT JOIN CYEAE_CUSTOMER c ON o.CUSTOMER_ID = c.CUSTOMER_ID
+            WHERE o.{OPEN_FILTER} AND o.STATUS IN ({placeholders})
+            ORDER BY o.ORDER_ID
+            LIMIT ?
+        """, (*statuses, limit)).fetchall()
+        items = self.db._load_order_items(conn, [row[0] for row in orders])
+        return [(row, items.get(row[0], [])) for row in orders]
+
+    def stats(self):
+        with self.db.db_manager.connection() as conn:
+            rows = conn.execute(f"""
+                SELECT STATUS, COUNT(*) FROM CYEAE_ORDERS {OPEN_INDEX}
+                WHERE {OPEN_FILTER}
+                GROUP BY STATUS
+            """).fetchall()
+        counts = dict.fromkeys(OPEN_STATUSES, 0)
+        counts.update(rows)
+        return {'open': sum(counts.values()), 'by_status': counts}
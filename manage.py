@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Maintenance commands for the Coffee Ordering System database
+
+Usage:
+    python manage.py migrate            Apply pending schema migrations
+    python manage.py analyze            Refresh the query planner statistics
+    python manage.py explain            Print EXPLAIN QUERY PLAN for every CoffeeShopDB query
+    python manage.py rebuild-sales      Recompute the daily sales rollup (after backfills)
+    python manage.py rebuild-analytics  Rebuild the columnar report snapshot from scratch
+    python manage.py build-assets       Build hashed, compressed and resized static assets
+    python manage.py dedup-customers    Merge duplicate customers and re-point their orders
+"""
+
+import argparse
+import os
+
+import migrations
+import static_assets
+from database import CoffeeShopDB, DatabaseManager
+
+
+def migrate(args):
+    """Apply pending migrations (DatabaseManager also does this on startup)"""
+    db_manager = DatabaseManager(args.db)
+    applied = db_manager.migrate()
+    for step in applied:
+        print(f"✅ Applied migration {step.version}: {step.description}")
+    print(f"📦 Schema version: {db_manager.schema_version()} (latest {migrations.latest_version()})")
+
+
+def analyze(args):
+    """Run ANALYZE so the planner picks the right indexes"""
+    DatabaseManager(args.db).analyze()
+    print("✅ Planner statistics refreshed")
+
+
+def explain(args):
+    """Dump the query plan of each query issued by CoffeeShopDB"""
+    db = CoffeeShopDB(args.db)
+    for method, sql, plan in db.explain_queries():
+        print(f"=== {method}")
+        print(f"    {sql}")
+        for line in plan:
+            print(f"    -> {line}")
+        print()
+
+
+def rebuild_sales(args):
+    """Recompute CYEAE_DAILY_SALES from the orders table"""
+    db_manager = DatabaseManager(args.db)
+    rows = db_manager.rebuild_daily_sales()
+    print(f"✅ Daily sales rollup rebuilt: {rows} day/payment rows")
+
+
+def rebuild_analytics(args):
+    """Drop and rebuild the columnar snapshot the report endpoints read"""
+    db = CoffeeShopDB(args.db, analytics_dir=args.analytics_dir)
+    db.analytics.rebuild()
+    stats = db.analytics.stats()
+    print(f"✅ Analytics snapshot rebuilt: {stats['rows']['orders']} orders, {stats['rows']['items']} items")
+
+
+def build_assets(args):
+    """Build static/dist ahead of time (run the app with STATIC_ASSETS=prebuilt)"""
+    assets = static_assets.StaticAssets(args.static_dir)
+    manifest = assets.build()
+    variants = sum(len(entry.get('variants', {})) for entry in manifest.values())
+    print(f"✅ Built {len(manifest)} assets ({variants} image sizes) into {assets.output_dir}")
+    if static_assets.Image is None:
+        print("ℹ️  Pillow is not installed: product images were copied without resized/WebP variants")
+    if static_assets.brotli is None:
+        print("ℹ️  brotli is not installed: CSS/JS are precompressed with gzip only")
+
+
+def dedup_customers(args):
+    """Fold walk-in customers sharing a phone number or email into one row (one-off clean-up)"""
+    db = CoffeeShopDB(args.db)
+    stats = db.merge_duplicate_customers(dry_run=args.dry_run)
+    verb = 'Would merge' if args.dry_run else 'Merged'
+    print(f"✅ {verb} {stats['merged']} of {stats['customers']} customers in {stats['groups']} groups, "
+          f"{stats['orders_moved']} orders re-pointed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Coffee Ordering System maintenance commands')
+    parser.add_argument('--db', default='coffee_shop.db', help='SQLite database file')
+    parser.add_argument('--analytics-dir', default='analytics', help='Columnar report snapshot directory')
+    parser.add_argument('--static-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'),
+                        help='Static files directory')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('migrate', help='Apply pending schema migrations').set_defaults(func=migrate)
+    subparsers.add_parser('analyze', help='Refresh query planner statistics').set_defaults(func=analyze)
+    subparsers.add_parser('explain', help='Print EXPLAIN QUERY PLAN for every query').set_defaults(func=explain)
+    subparsers.add_parser('rebuild-sales', help='Recompute the daily sales rollup table').set_defaults(func=rebuild_sales)
+    subparsers.add_parser('rebuild-analytics', help='Rebuild the columnar report snapshot').set_defaults(
+        func=rebuild_analytics)
+    subparsers.add_parser('build-assets', help='Build hashed, compressed and resized static assets').set_defaults(
+        func=build_assets)
+    dedup = subparsers.add_parser('dedup-customers', help='Merge duplicate customers and re-point their orders')
+    dedup.add_argument('--dry-run', action='store_true', help='Report what would be merged without changing anything')
+    dedup.set_defaults(func=dedup_customers)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""
+Live order feed for the admin screens (Server-Sent Events)
+
+OrderFeed is an in-process pub/sub of order events. New orders are found by
+one tail query on ORDER_ID (`WHERE ORDER_ID > watermark`), run by a single
+feed thread whenever this process commits orders (publish()) and otherwise
+every poll_interval seconds, so orders written by other worker processes
+show up too. Every open stream is fed from that one query: a screen costs
+one small event per order, not a reload of the order list.
+
+Events of new orders carry their ORDER_ID as the SSE id, so a client that
+reconnects with Last-Event-ID gets the orders it missed (from a backlog of
+recent events, or from the database, backlog rows per query). A gap longer
+than max_pending orders is replayed in parts: the stream ends after the
+first max_pending, and the browser reconnects from the last one it got.
+Status changes are pushed with publish_status() and have no id; they are
+not replayed.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+
+ORDER_COLUMNS = ('order_id', 'customer_name', 'order_date', 'status', 'payment_method', 'total_amount',
+                 'customer_id')
+
+TAIL_SQL = """
+    SELECT o.ORDER_ID, c.NAME, o.ORDER_DATE, o.STATUS, o.PAYMENT_METHOD, o.TOTAL_AMOUNT, o.CUSTOMER_ID
+    FROM CYEAE_ORDERS o
+    LEFT JOIN CYEAE_CUSTOMER c ON o.CUSTOMER_ID = c.CUSTOMER_ID
+    WHERE o.ORDER_ID > ?
+    ORDER BY o.ORDER_ID
+    LIMIT ?
+"""
+
+# Comment line sent on idle streams so proxies keep the connection open
+KEEPALIVE = b': keepalive\n\n'
+
+
+def format_event(event):
+    """SSE wire format of an event dict ({'id', 'event', 'data'})."""
+    lines = []
+    if event.get('id') is not None:
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['event']}")
+    lines.append('data: ' + json.dumps(event['data'], separators=(',', ':')))
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+
+def parse_last_event_id(value):
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+class Subscription:
+    """Pending events of one stream; filled by the feed thread, drained by the stream."""
+
+    def __init__(self, notify=None, max_pending=1000):
+        self.notify = notify
+        self.max_pending = max_pending
+        self.closed = False
+        self._events = deque()
+        self._cond = threading.Condition()
+
+    def put(self, events):
+        with self._cond:
+            if self.closed:
+                return
+            if len(self._events) + len(events) > self.max_pending:
+                # A stream this far behind is dropped; the client resumes from Last-Event-ID
+                self.closed = True
+                self._events.clear()
+            else:
+                self._events.extend(events)
+            self._cond.notify()
+        if self.notify is not None:
+            self.notify()
+
+    def finish(self, events):
+        """Queue events as the last ones of this stream: it ends once they are sent."""
+        with self._cond:
+            if not self.closed:
+                self._events.extend(events)
+                self.closed = True
+            self._cond.notify()
+        if self.notify is not None:
+            self.notify()
+
+    def drain(self):
+        with self._cond:
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+    def get(self, timeout=None):
+        """Block until events arrive (or timeout); returns them, [] on timeout."""
+        with self._cond:
+            if not self._events and not self.closed:
+                self._cond.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+
+class OrderFeed:
+    def __init__(self, db, poll_interval=1.0, backlog=500, max_pending=1000):
+        self.db = db
+        self.poll_interval = poll_interval
+        self.backlog = backlog
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._subscribers = set()
+        self._recent = deque(maxlen=backlog)
+        self._watermark = None
+        self._thread = None
+        self._conn = None
+        self._stats = {'published': 0, 'events': 0, 'polls': 0, 'dropped': 0, 'subscribed': 0}
+
+    def publish(self):
+        """Orders were committed in this process: look for them now instead of at the next poll."""
+        self._wake.set()
+
+    def publish_status(self, order_id, status, **fields):
+        """Push a status change of an existing order to every open stream."""
+        event = {'id': None, 'event': 'status', 'data': dict(fields, order_id=order_id, status=status)}
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.put([event])
+
+    def subscribe(self, last_event_id=None, notify=None):
+        """Open a stream; events after last_event_id (an ORDER_ID) are queued on it first."""
+        subscription = Subscription(notify, self.max_pending)
+        with self._lock:
+            self._ensure_started()
+            if self._watermark is None:
+                self._watermark = self._max_order_id()
+            if last_event_id is not None and last_event_id < self._watermark:
+                events, complete = self._replay(last_event_id)
+                if complete:
+                    subscription.put(events)
+                else:
+                    subscription.finish(events)
+            self._subscribers.add(subscription)
+            self._stats['subscribed'] += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def _replay(self, last_event_id):
+        """Created-order events in (last_event_id, watermark], oldest first.
+
+        Returns (events, complete). At most max_pending events are read,
+        backlog rows per query; complete is False if the gap holds more.
+        """
+        if self._recent and self._recent[0]['id'] <= last_event_id + 1:
+            return [event for event in self._recent if event['id'] > last_event_id], True
+        events = []
+        while len(events) < self.max_pending:
+            limit = min(self.backlog, self.max_pending - len(events))
+            rows = self._connection().execute(TAIL_SQL, (last_event_id, limit)).fetchall()
+            rows = [row for row in rows if row[0] <= self._watermark]
+            events.extend(self._event(row) for row in rows)
+            if len(rows) < limit:
+                return events, True
+            last_event_id = rows[-1][0]
+        return events, last_event_id >= self._watermark
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='order-feed', daemon=True)
+            self._thread.start()
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = self.db.db_manager.get_connection()
+        return self._conn
+
+    def _max_order_id(self):
+        return self._connection().execute("SELECT COALESCE(MAX(ORDER_ID), 0) FROM CYEAE_ORDERS").fetchone()[0]
+
+    def _event(self, row):
+        data = dict(zip(ORDER_COLUMNS, row))
+        if data['total_amount'] is not None:
+            data['total_amount'] = float(data['total_amount'])
+        return {'id': row[0], 'event': 'order', 'data': data}
+
+    def _run(self):
+        while not self._stop.is_set():
+            published = self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self._poll(published)
+            except sqlite3.Error:
+                # Transient (e.g. database busy); the next poll picks up from the same watermark
+                time.sleep(self.poll_interval)
+
+    def _poll(self, published):
+        with self._lock:
+            if not self._subscribers:
+                # Nobody listening: start from the current end when someone subscribes
+                self._watermark = None
+                self._recent.clear()
+                return
+            self._stats['polls'] += 1
+            if published:
+                self._stats['published'] += 1
+            while True:
+                rows = self._connection().execute(TAIL_SQL, (self._watermark, self.backlog)).fetchall()
+                if not rows:
+                    break
+                events = [self._event(row) for row in rows]
+                self._watermark = rows[-1][0]
+                self._recent.extend(events)
+                self._stats['events'] += len(events)
+                for subscription in list(self._subscribers):
+                    subscription.put(events)
+                    if subscription.closed:
+                        self._subscribers.discard(subscription)
+                        self._stats['dropped'] += 1
+                if len(rows) < self.backlog:
+                    break
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['subscribers'] = len(self._subscribers)
+            stats['watermark'] = self._watermark
+        return stats
+
+    def close(self):
+        """End every open stream and stop the feed thread."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        with self._lock:
+            subscribers, self._subscribers = list(self._subscribers), set()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        for subscription in subscribers:
+            subscription.close()
@@ -0,0 +1,197 @@
+"""
+Single-writer order queue for the Coffee Ordering System
+
+SQLite allows one writer at a time, so request threads that each open their
+own write transaction mostly end up waiting on the database lock. Instead,
+POST /api/orders hands its order to OrderWriter and waits on a future: one
+writer thread takes whatever jobs are queued, writes each one under its own
+SAVEPOINT and commits the whole group at once, so a burst of orders shares a
+single transaction (and a single WAL sync). A job that fails validation only
+rolls back its own savepoint; the rest of the group still commits.
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+
+class WriterBusy(Exception):
+    """The order queue is full; the caller should retry later."""
+
+
+class WriterClosed(Exception):
+    """The writer has been shut down."""
+
+
+class _Job:
+    __slots__ = ('customer_id', 'customer', 'payment_method', 'order_items', 'future', 'enqueued_at')
+
+    def __init__(self, customer_id, customer, payment_method, order_items):
+        self.customer_id = customer_id
+        self.customer = customer
+        self.payment_method = payment_method
+        self.order_items = order_items
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+_STOP = object()
+
+
+class OrderWriter:
+    def __init__(self, db, max_queue=1000, max_batch=64, linger_ms=0):
+        self.db = db
+        self.max_queue = max_queue
+        self.max_batch = max_batch
+        self.linger = linger_ms / 1000
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats = {
+            'submitted': 0,
+            'rejected': 0,
+            'committed': 0,
+            'failed': 0,
+            'batches': 0,
+            'batch_max': 0,
+            'queue_depth_max': 0,
+            'commit_time_total': 0.0,
+            'latency_total': 0.0,
+            'latency_max': 0.0,
+        }
+        self._conn = db.db_manager.get_connection()
+        self._thread = threading.Thread(target=self._run, name='order-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, customer_id, payment_method, order_items, customer=None):
+        """Queue an order and return a Future resolving to its ORDER_ID once committed.
+
+        customer is a dict (name, phone, email, address) for a walk-in customer
+        created in the same transaction; otherwise customer_id must be set.
+        Raises WriterBusy when max_queue orders are already waiting.
+        """
+        # Reject malformed items before they take a queue slot
+        self.db._parse_order_items(order_items)
+        job = _Job(customer_id, customer, payment_method, order_items)
+        with self._lock:
+            if self._closed:
+                raise WriterClosed("order writer is closed")
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self._stats['rejected'] += 1
+                raise WriterBusy(f"order queue is full ({self.max_queue} pending)")
+            self._stats['submitted'] += 1
+            self._stats['queue_depth_max'] = max(self._stats['queue_depth_max'], self._queue.qsize())
+        return job.future
+
+    def create_order(self, customer_id, payment_method, order_items, customer=None, timeout=None):
+        """Blocking submit(): returns the ORDER_ID or raises the job's error."""
+        return self.submit(customer_id, payment_method, order_items, customer).result(timeout)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is _STOP:
+                break
+            jobs = [job]
+            deadline = time.perf_counter() + self.linger
+            stop = False
+            while len(jobs) < self.max_batch:
+                try:
+                    remaining = deadline - time.perf_counter()
+                    job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is _STOP:
+                    stop = True
+                    break
+                jobs.append(job)
+            self.write_batch(jobs)
+            if stop:
+                break
+        self._conn.close()
+
+    def write_batch(self, jobs):
+        """写入一组订单: 每个订单一个 SAVEPOINT, 整组一次 COMMIT"""
+        cursor = self._conn.cursor()
+        results = []
+        start = time.perf_counter()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            for job in jobs:
+                cursor.execute("SAVEPOINT order_job")
+                try:
+                    customer_id = job.customer_id
+                    if not customer_id:
+                        c = job.customer
+                        customer_id = self.db._resolve_customer(
+                            cursor, c['name'], c.get('phone', ''), c.get('email', ''), c.get('address', '')
+                        )
+                    order_id = self.db._insert_order(cursor, customer_id, job.payment_method, job.order_items)
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO order_job")
+                    cursor.execute("RELEASE order_job")
+                    results.append((job, None, e))
+                    continue
+                cursor.execute("RELEASE order_job")
+                results.append((job, order_id, None))
+            self._conn.commit()
+        except Exception as e:
+            try:
+                self._conn.rollback()
+            except sqlite3.Error:
+                pass
+            for job in jobs:
+                job.future.set_exception(e)
+            with self._lock:
+                self._stats['failed'] += len(jobs)
+                self._stats['batches'] += 1
+            return
+
+        done = time.perf_counter()
+        if any(error is None for _, _, error in results):
+            self.db.order_feed.publish()
+        committed = 0
+        latency_total = 0.0
+        latency_max = 0.0
+        for job, order_id, error in results:
+            if error is not None:
+                job.future.set_exception(error)
+                continue
+            job.future.set_result(order_id)
+            committed += 1
+            latency = done - job.enqueued_at
+            latency_total += latency
+            latency_max = max(latency_max, latency)
+        with self._lock:
+            stats = self._stats
+            stats['committed'] += committed
+            stats['failed'] += len(jobs) - committed
+            stats['batches'] += 1
+            stats['batch_max'] = max(stats['batch_max'], len(jobs))
+            stats['commit_time_total'] += done - start
+            stats['latency_total'] += latency_total
+            stats['latency_max'] = max(stats['latency_max'], latency_max)
+
+    def close(self, timeout=None):
+        """Stop accepting orders, finish the queued ones and stop the writer thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queue_depth'] = self._queue.qsize()
+        stats['max_queue'] = self.max_queue
+        batches = stats['batches']
+        stats['batch_avg'] = (stats['committed'] + stats['failed']) / batches if batches else 0.0
+        stats['commit_time_avg'] = stats['commit_time_total'] / batches if batches else 0.0
+        stats['latency_avg'] = stats['latency_total'] / stats['committed'] if stats['committed'] else 0.0
+        return stats
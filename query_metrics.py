@@ -0,0 +1,313 @@
+"""
+Per-statement timing for the Coffee Ordering System data layer
+
+DatabaseManager opens its connections with InstrumentedConnection, so every
+statement CoffeeShopDB runs is timed from execute() until its last row is
+fetched. QueryMonitor keeps cumulative counters, a latency histogram and a
+rolling window of recent durations per (calling method, statement), and logs
+statements slower than a threshold together with their query plan.
+"""
+
+import logging
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger('coffee_shop.slow_queries')
+
+# Upper bounds (ms) of the histogram buckets; the last bucket is open-ended
+HISTOGRAM_BOUNDS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+
+_WHITESPACE = re.compile(r'\s+')
+_PLACEHOLDER_LIST = re.compile(r'\?(\s*,\s*\?)+')
+_QUERY_PREFIXES = ('SELECT', 'WITH')
+
+# Frames in these files are never reported as the caller
+_SKIP_FILES = (__file__,)
+
+
+def normalize_sql(sql):
+    """Collapse whitespace and variable-length IN (?, ?, ...) lists so they aggregate together"""
+    return _PLACEHOLDER_LIST.sub('?, ...', _WHITESPACE.sub(' ', sql).strip())
+
+
+# code object -> "Class.method" for public data-layer methods, None for any
+# other code; f_locals is read once per code object, not per statement
+_METHOD_NAMES = {}
+
+
+def _method_name(frame):
+    code = frame.f_code
+    try:
+        return _METHOD_NAMES[code]
+    except KeyError:
+        pass
+    name = None
+    if code.co_filename not in _SKIP_FILES and not code.co_name.startswith('_') and code.co_name != '<lambda>':
+        owner = frame.f_locals.get('self')
+        if owner is not None:
+            # Named after the class first seen running it; a subclass reusing
+            # the method is reported under that class
+            name = f"{type(owner).__name__}.{code.co_name}"
+    _METHOD_NAMES[code] = name
+    return name
+
+
+def _caller():
+    """Class.method of the nearest public data-layer method on the stack"""
+    frame = sys._getframe(2)
+    fallback = None
+    depth = 0
+    while frame is not None and depth < 20:
+        name = _method_name(frame)
+        if name is not None:
+            return name
+        if fallback is None and frame.f_code.co_filename not in _SKIP_FILES:
+            fallback = frame.f_code.co_name
+        frame = frame.f_back
+        depth += 1
+    return fallback or 'unknown'
+
+
+class _Series:
+    __slots__ = ('count', 'errors', 'rows', 'total_ms', 'max_ms', 'buckets', 'recent')
+
+    def __init__(self, window):
+        self.count = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        self.recent = deque(maxlen=window)
+
+    def add(self, duration_ms, rows, error):
+        self.count += 1
+        self.errors += error
+        self.rows += rows
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        for i, bound in enumerate(HISTOGRAM_BOUNDS_MS):
+            if duration_ms <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        self.recent.append(duration_ms)
+
+    def snapshot(self):
+        recent = sorted(self.recent)
+
+        def pct(p):
+            return round(recent[min(len(recent) - 1, int(p / 100 * len(recent)))], 3) if recent else 0.0
+
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'rows': self.rows,
+            'total_ms': round(self.total_ms, 3),
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'max_ms': round(self.max_ms, 3),
+            'p50_ms': pct(50),
+            'p95_ms': pct(95),
+            'p99_ms': pct(99),
+            'histogram': [{'le_ms': bound, 'count': n}
+                          for bound, n in zip(HISTOGRAM_BOUNDS_MS + (None,), self.buckets)],
+        }
+
+
+class QueryMonitor:
+    """Thread-safe aggregates of statement timings, keyed by (method, normalized SQL)"""
+
+    def __init__(self, slow_query_ms=200, window=512, max_series=500, enabled=True):
+        self.slow_query_ms = slow_query_ms
+        self.window = window
+        self.max_series = max_series
+        self.enabled = enabled
+        self._series = {}
+        self._slow = deque(maxlen=50)
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def record(self, conn, sql, params, duration, rows, caller, error=False, explain=True):
+        duration_ms = duration * 1000
+        key = (caller, normalize_sql(sql))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                if len(self._series) >= self.max_series:
+                    key = (caller, '<other statements>')
+                    series = self._series.get(key)
+                if series is None:
+                    series = self._series[key] = _Series(self.window)
+            series.add(duration_ms, rows, error)
+
+        if self.slow_query_ms is not None and duration_ms >= self.slow_query_ms:
+            plan = self._plan(conn, sql, params) if explain and not error else None
+            entry = {
+                'at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'method': caller,
+                'duration_ms': round(duration_ms, 3),
+                'rows': rows,
+                'sql': key[1],
+                'plan': plan,
+            }
+            with self._lock:
+                self._slow.append(entry)
+            logger.warning("slow query %.1fms in %s (%d rows): %s\n    plan: %s",
+                           duration_ms, caller, rows, key[1], ' | '.join(plan or ['n/a']))
+
+    def _plan(self, conn, sql, params):
+        if not sql.lstrip().upper().startswith(_QUERY_PREFIXES):
+            return None
+        try:
+            # A plain cursor so the EXPLAIN itself is not measured
+            rows = sqlite3.Cursor(conn).execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+            return [row[3] for row in rows]
+        except Exception:
+            return None
+
+    def snapshot(self):
+        with self._lock:
+            series = [(key, s.snapshot()) for key, s in self._series.items()]
+            slow = list(self._slow)
+        queries = [dict(method=method, sql=sql, **stats) for (method, sql), stats in series]
+        queries.sort(key=lambda q: q['total_ms'], reverse=True)
+
+        by_method = {}
+        for q in queries:
+            m = by_method.setdefault(q['method'], {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0})
+            m['count'] += q['count']
+            m['total_ms'] = round(m['total_ms'] + q['total_ms'], 3)
+            m['max_ms'] = max(m['max_ms'], q['max_ms'])
+            m['rows'] += q['rows']
+        return {
+            'since': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started_at)),
+            'slow_query_ms': self.slow_query_ms,
+            'methods': by_method,
+            'queries': queries,
+            'slow_queries': slow,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._slow.clear()
+            self.started_at = time.time()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Times a statement from execute() until its result set is exhausted or discarded"""
+
+    _pending = None
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        monitor = getattr(self.connection, 'monitor', None)
+        if monitor is None or not monitor.enabled:
+            return super().execute(sql, parameters)
+        caller = _caller()
+        start = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        except sqlite3.Error:
+            monitor.record(self.connection, sql, parameters, time.perf_counter() - start, 0, caller, error=True)
+            raise
+        self._pending = [monitor, sql, parameters, time.perf_counter() - start, 0, caller]
+        if self.description is None:
+            self._pending[4] = max(self.rowcount, 0)
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        monitor = getattr(self.connection, 'monitor', None)
+        if monitor is None or not monitor.enabled:
+            return super().executemany(sql, seq_of_parameters)
+        caller = _caller()
+        start = time.perf_counter()
+        error = False
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        except sqlite3.Error:
+            error = True
+            raise
+        finally:
+            rows = 0 if error else max(self.rowcount, 0)
+            monitor.record(self.connection, sql, (), time.perf_counter() - start, rows, caller,
+                           error=error, explain=False)
+
+    def _timed_fetch(self, fetch, *args):
+        pending = self._pending
+        if pending is None:
+            return fetch(*args)
+        start = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            pending[3] += time.perf_counter() - start
+
+    def fetchone(self):
+        row = self._timed_fetch(super().fetchone)
+        if self._pending is not None:
+            if row is None:
+                self._finish()
+            else:
+                self._pending[4] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        rows = self._timed_fetch(super().fetchmany, size)
+        if self._pending is not None:
+            self._pending[4] += len(rows)
+            if len(rows) < size:
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed_fetch(super().fetchall)
+        if self._pending is not None:
+            self._pending[4] += len(rows)
+            self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._timed_fetch(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+        if self._pending is not None:
+            self._pending[4] += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # The connection may already be back in the pool here, so skip EXPLAIN
+        self._finish(explain=False)
+
+    def _finish(self, explain=True):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            monitor, sql, params, duration, rows, caller = pending
+            monitor.record(self.connection, sql, params, duration, rows, caller, explain=explain)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    monitor = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
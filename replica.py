@@ -0,0 +1,174 @@
+"""
+Read replica for reporting traffic
+
+ReadReplica keeps a copy of the primary database in a second file,
+refreshed every `interval` seconds by a background thread with SQLite's
+online backup API. The backup runs as one step inside a single read
+transaction on the primary, which under WAL never blocks order writes, and
+lands in the replica as one write transaction, so readers of the replica
+always see a complete, consistent copy.
+
+Report and history queries are served from the replica's own connection pool
+while the copy is younger than `max_lag` seconds; past that (or before the
+first refresh) DatabaseManager.read_connection() falls back to the primary.
+
+Several worker processes may share one replica file: refreshes are
+serialized with an flock, and the time of the last refresh is kept in a
+small state file next to the replica, so a process does not copy the
+database again when another one has just done so.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, one worker only
+    fcntl = None
+
+# Pragmas for the replica's reader connections; query_only makes accidental
+# writes fail instead of diverging from the primary
+REPLICA_PRAGMAS = (
+    ('query_only', 1),
+    ('busy_timeout', 5000),
+    ('cache_size', -16000),
+    ('temp_store', 'MEMORY'),
+)
+
+
+class ReadReplica:
+    def __init__(self, primary_path, replica_path, pool, interval=10.0, max_lag=60.0):
+        self.primary_path = primary_path
+        self.replica_path = replica_path
+        self.pool = pool
+        self.interval = interval
+        self.max_lag = max_lag
+        self._state_path = replica_path + '.state'
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refreshed_at = None
+        self._stats = {
+            'refreshes': 0,
+            'refresh_failures': 0,
+            'refresh_time_total': 0.0,
+            'refresh_time_last': 0.0,
+            'replica_reads': 0,
+            'primary_fallbacks': 0,
+            'last_error': None,
+        }
+        self._thread = None
+
+    def start(self):
+        """Refresh now and then every interval seconds on a daemon thread."""
+        self._thread = threading.Thread(target=self._run, name='replica-refresh', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except sqlite3.Error as e:
+                with self._lock:
+                    self._stats['refresh_failures'] += 1
+                    self._stats['last_error'] = str(e)
+            self._stop.wait(self.interval)
+
+    def refresh(self, force=False):
+        """Copy the primary into the replica unless a copy younger than interval exists.
+
+        Returns True if this call made a new copy.
+        """
+        with self._file_lock():
+            refreshed_at = self._read_state()
+            if not force and refreshed_at is not None and time.time() - refreshed_at < self.interval:
+                self._set_refreshed_at(refreshed_at)
+                return False
+
+            started = time.perf_counter()
+            # The copy holds everything committed before the backup's read transaction began
+            snapshot_at = time.time()
+            source = sqlite3.connect(self.primary_path, timeout=30)
+            try:
+                target = sqlite3.connect(self.replica_path, timeout=30)
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+            finally:
+                source.close()
+            self._write_state(snapshot_at)
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats['refreshes'] += 1
+            self._stats['refresh_time_total'] += elapsed
+            self._stats['refresh_time_last'] = elapsed
+            self._stats['last_error'] = None
+        self._set_refreshed_at(snapshot_at)
+        return True
+
+    def lag(self):
+        """Seconds since the current copy was taken, or None before the first refresh."""
+        refreshed_at = self._refreshed_at
+        return None if refreshed_at is None else max(0.0, time.time() - refreshed_at)
+
+    def is_fresh(self):
+        lag = self.lag()
+        fresh = lag is not None and lag <= self.max_lag
+        with self._lock:
+            self._stats['replica_reads' if fresh else 'primary_fallbacks'] += 1
+        return fresh
+
+    def _set_refreshed_at(self, refreshed_at):
+        with self._lock:
+            if self._refreshed_at is None or refreshed_at > self._refreshed_at:
+                self._refreshed_at = refreshed_at
+
+    def _read_state(self):
+        try:
+            with open(self._state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get('primary') != os.path.abspath(self.primary_path) or not os.path.exists(self.replica_path):
+            return None
+        return state.get('refreshed_at')
+
+    def _write_state(self, refreshed_at):
+        tmp = self._state_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'primary': os.path.abspath(self.primary_path), 'refreshed_at': refreshed_at}, f)
+        os.replace(tmp, self._state_path)
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.replica_path + '.lock', 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def stats(self):
+        lag = self.lag()
+        with self._lock:
+            stats = dict(self._stats)
+        stats['lag'] = lag
+        stats['max_lag'] = self.max_lag
+        stats['interval'] = self.interval
+        stats['pool'] = self.pool.stats()
+        return stats
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.pool.close_all()
@@ -0,0 +1,159 @@
+"""
+Time-bucketed sales aggregation for the Coffee Ordering System
+
+compile_sales_query() turns a bucket size (hour/day/week/month), a date range
+and a list of group-by dimensions into one parameterized SQL statement. Only
+whitelisted expressions are ever interpolated, and the date range is a plain
+ORDER_DATE range predicate, so idx_orders_date bounds the scan.
+
+SalesBucketCache caches results by parameters. Each query is split at a
+cutoff: buckets before the current one (and before today) are "closed" and
+cached until the orders behind them actually change; the open tail is cached
+for a short TTL only.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+# bucket -> SQL expression of its start, as text
+BUCKETS = {
+    'hour': "strftime('%Y-%m-%d %H:00:00', o.ORDER_DATE)",
+    'day': "DATE(o.ORDER_DATE)",
+    'week': "DATE(o.ORDER_DATE, 'weekday 0', '-6 days')",  # weeks start on Monday
+    'month': "strftime('%Y-%m-01', o.ORDER_DATE)",
+}
+
+# dimension -> (output columns as (name, expression), needs the order items join)
+DIMENSIONS = {
+    'product': ((('product_id', 'oi.PRODUCT_ID'), ('product_name', 'p.NAME')), True),
+    'category': ((('category_id', 'p.CATEGORY_ID'), ('category_name', 'c.CATEGORY_NAME')), True),
+    'payment_method': ((('payment_method', "COALESCE(o.PAYMENT_METHOD, '')"),), False),
+    'customer_type': ((('customer_type', 'cu.CUSTOMER_TYPE'),), False),
+}
+
+# Upper bound on buckets per query (e.g. hourly over ~7 months)
+MAX_BUCKETS = 5000
+
+BUCKET_DAYS = {'hour': 1 / 24, 'day': 1, 'week': 7, 'month': 28}
+
+
+def parse_group_by(value):
+    """'product,payment_method' -> ('product', 'payment_method'); raises ValueError on unknown names."""
+    if not value:
+        return ()
+    names = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in names if name not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown group_by dimension(s): {', '.join(unknown)}; "
+                         f"expected {', '.join(DIMENSIONS)}")
+    return names
+
+
+def compile_sales_query(bucket, group_by, start, end):
+    """Returns (sql, params, columns) for ORDER_DATE in [start, end) ('YYYY-MM-DD HH:MM:SS' strings)."""
+    if bucket not in BUCKETS:
+        raise ValueError(f"Unknown bucket: {bucket}; expected {', '.join(BUCKETS)}")
+    item_level = any(DIMENSIONS[name][1] for name in group_by)
+
+    columns = ['bucket']
+    select = [f"{BUCKETS[bucket]} AS bucket"]
+    # Group on the expressions: aliases like category_id would clash with table columns
+    group = [BUCKETS[bucket]]
+    for name in group_by:
+        for column, expression in DIMENSIONS[name][0]:
+            columns.append(column)
+            select.append(f"{expression} AS {column}")
+            group.append(expression)
+
+    if item_level:
+        # Revenue per product/category comes from the order lines
+        select += ["COUNT(DISTINCT o.ORDER_ID) AS order_count",
+                   "SUM(oi.QUANTITY) AS quantity",
+                   "TOTAL(oi.LINE_AMOUNT) AS total_sales"]
+        columns += ['order_count', 'quantity', 'total_sales']
+    else:
+        select += ["COUNT(*) AS order_count", "TOTAL(o.TOTAL_AMOUNT) AS total_sales"]
+        columns += ['order_count', 'total_sales']
+
+    joins = []
+    if item_level:
+        joins.append("JOIN CYEAE_ORDER_ITEMS oi ON oi.ORDER_ID = o.ORDER_ID")
+        joins.append("LEFT JOIN CYEAE_PRODUCT p ON p.PRODUCT_ID = oi.PRODUCT_ID")
+    if 'category' in group_by:
+        joins.append("LEFT JOIN CYEAE_CATEGORY c ON c.CATEGORY_ID = p.CATEGORY_ID")
+    if 'customer_type' in group_by:
+        joins.append("LEFT JOIN CYEAE_CUSTOMER cu ON cu.CUSTOMER_ID = o.CUSTOMER_ID")
+
+    sql = f"""
+        SELECT {', '.join(select)}
+        FROM CYEAE_ORDERS o
+        {' '.join(joins)}
+        WHERE o.ORDER_DATE >= ? AND o.ORDER_DATE < ? AND o.STATUS IS NOT 'cancelled'
+        GROUP BY {', '.join(group)}
+        ORDER BY {', '.join(group)}
+    """
+    return sql, (start, end), columns
+
+
+def bucket_start(bucket, moment):
+    """Start of the bucket containing moment (a datetime)."""
+    if bucket == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = datetime.combine(moment.date(), datetime.min.time())
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def resolve_range(bucket, start_date=None, end_date=None, default_days=30):
+    """Inclusive 'YYYY-MM-DD' dates -> (start, end_exclusive) datetimes; raises ValueError."""
+    end = date.fromisoformat(end_date) if end_date else datetime.utcnow().date()
+    start = date.fromisoformat(start_date) if start_date else end - timedelta(days=default_days - 1)
+    if start > end:
+        raise ValueError("start_date is after end_date")
+    start = bucket_start(bucket, datetime.combine(start, datetime.min.time()))
+    end = datetime.combine(end + timedelta(days=1), datetime.min.time())
+    if (end - start).days / BUCKET_DAYS[bucket] > MAX_BUCKETS:
+        raise ValueError(f"Range too large for {bucket} buckets (at most {MAX_BUCKETS})")
+    return start, end
+
+
+class SalesBucketCache:
+    """LRU of query results: closed ranges keyed by a validity token, open ranges by TTL."""
+
+    def __init__(self, max_entries=256, open_ttl=30):
+        self.max_entries = max_entries
+        self.open_ttl = open_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, token=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_token, expires_at, rows = entry
+                if stored_token == token and (expires_at is None or expires_at > time.monotonic()):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return rows
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, rows, token=None):
+        expires_at = None if token is not None else time.monotonic() + self.open_ttl
+        with self._lock:
+            self._entries[key] = (token, expires_at, rows)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
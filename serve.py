@@ -0,0 +1,62 @@
+"""
+Production launcher for the Coffee Ordering System
+
+Migrates the database once, then starts several uvicorn worker processes
+serving asgi:application. SQLite in WAL mode lets the workers read in
+parallel; writers queue on the database lock (busy_timeout). With more than
+one worker, sessions are kept in the shared SQLite session store, since an
+in-process store would lose logins whenever a request lands on another worker.
+Static assets are built here once too, and the workers load the result.
+
+    python serve.py --workers 4 --port 5050
+"""
+
+import argparse
+import os
+import sys
+
+import static_assets
+from database import DatabaseManager
+from sessions import SQLiteSessionStore
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5050)))
+    parser.add_argument('--workers', type=int,
+                        default=int(os.environ.get('WEB_CONCURRENCY', min(4, os.cpu_count() or 1))))
+    parser.add_argument('--db', default=os.environ.get('COFFEE_DB_PATH', 'coffee_shop.db'))
+    parser.add_argument('--log-level', default='info')
+    args = parser.parse_args(argv)
+
+    try:
+        import uvicorn
+    except ImportError:
+        print("uvicorn is not installed: pip install -r requirements.txt", file=sys.stderr)
+        return 1
+
+    # Create / migrate the schema before forking so workers never race on it
+    DatabaseManager(args.db, pool_size=1).pool.close_all()
+    os.environ['COFFEE_DB_PATH'] = args.db
+
+    if os.environ.get('STATIC_ASSETS', 'build') == 'build':
+        static_assets.StaticAssets(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')).build()
+        os.environ['STATIC_ASSETS'] = 'prebuilt'
+
+    if args.workers > 1:
+        store = os.environ.setdefault('SESSION_STORE', 'sqlite')
+        if store != 'sqlite':
+            print(f"SESSION_STORE={store} is per process and cannot be shared by {args.workers} workers; "
+                  "use SESSION_STORE=sqlite or --workers 1", file=sys.stderr)
+            return 1
+        # Create the session table before forking, like the schema above
+        SQLiteSessionStore(os.environ.get('SESSION_DB_PATH', 'sessions.db'))
+
+    uvicorn.run('asgi:application', host=args.host, port=args.port, workers=args.workers,
+                log_level=args.log_level, lifespan='on')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
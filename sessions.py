@@ -0,0 +1,225 @@
+"""
+Server-side sessions for the Coffee Ordering System
+
+The session cookie only carries a random session id; the session contents
+(admin flag, the signed-in member's profile) live in a SessionStore:
+
+- MemorySessionStore: in-process LRU, the default for a single worker
+- SQLiteSessionStore: a small SQLite file shared by every worker process
+
+Entries expire ttl seconds after their last use. Expired entries are never
+returned, and a background sweeper thread deletes them periodically.
+"""
+
+import json
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+
+class MemorySessionStore:
+    def __init__(self, ttl=3600, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evicted': 0}
+
+    def get(self, sid):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            if entry[0] <= now:
+                del self._entries[sid]
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries[sid] = (now + self.ttl, entry[1])
+            self._entries.move_to_end(sid)
+            self._stats['hits'] += 1
+            return dict(entry[1])
+
+    def set(self, sid, data):
+        with self._lock:
+            self._entries[sid] = (time.time() + self.ttl, dict(data))
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evicted'] += 1
+
+    def delete(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+    def sweep(self):
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, (expires_at, _) in self._entries.items() if expires_at <= now]
+            for sid in expired:
+                del self._entries[sid]
+            self._stats['expired'] += len(expired)
+        return len(expired)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, size=len(self._entries), max_size=self.max_size)
+        stats['store'] = 'memory'
+        return stats
+
+
+class SQLiteSessionStore:
+    """Sessions in their own SQLite file, so session writes never queue behind order writes."""
+
+    def __init__(self, db_path='sessions.db', ttl=3600):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0}
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS CYEAE_SESSIONS (
+                SESSION_ID VARCHAR(64) PRIMARY KEY,
+                DATA TEXT NOT NULL,
+                EXPIRES_AT REAL NOT NULL
+            )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON CYEAE_SESSIONS(EXPIRES_AT)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self._stats[key] += n
+
+    def get(self, sid):
+        row = self._conn().execute(
+            "SELECT DATA, EXPIRES_AT FROM CYEAE_SESSIONS WHERE SESSION_ID = ?", (sid,)
+        ).fetchone()
+        if row is None or row[1] <= time.time():
+            self._count('misses')
+            return None
+        self._count('hits')
+        # Only rewrite the expiry once half the ttl is used up, not on every request
+        if row[1] - time.time() < self.ttl / 2:
+            self.touch(sid)
+        return json.loads(row[0])
+
+    def set(self, sid, data):
+        conn = self._conn()
+        conn.execute("""
+            INSERT INTO CYEAE_SESSIONS (SESSION_ID, DATA, EXPIRES_AT) VALUES (?, ?, ?)
+            ON CONFLICT (SESSION_ID) DO UPDATE SET DATA = excluded.DATA, EXPIRES_AT = excluded.EXPIRES_AT
+        """, (sid, json.dumps(data), time.time() + self.ttl))
+        conn.commit()
+
+    def touch(self, sid):
+        conn = self._conn()
+        conn.execute("UPDATE CYEAE_SESSIONS SET EXPIRES_AT = ? WHERE SESSION_ID = ?", (time.time() + self.ttl, sid))
+        conn.commit()
+
+    def delete(self, sid):
+        conn = self._conn()
+        conn.execute("DELETE FROM CYEAE_SESSIONS WHERE SESSION_ID = ?", (sid,))
+        conn.commit()
+
+    def sweep(self):
+        conn = self._conn()
+        removed = conn.execute("DELETE FROM CYEAE_SESSIONS WHERE EXPIRES_AT <= ?", (time.time(),)).rowcount
+        conn.commit()
+        self._count('expired', removed)
+        return removed
+
+    def stats(self):
+        size = self._conn().execute("SELECT COUNT(*) FROM CYEAE_SESSIONS").fetchone()[0]
+        with self._lock:
+            stats = dict(self._stats, size=size)
+        stats['store'] = 'sqlite'
+        return stats
+
+
+def start_sweeper(store, interval=60):
+    """Delete expired sessions every interval seconds on a daemon thread."""
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                store.sweep()
+            except sqlite3.Error:
+                pass
+    thread = threading.Thread(target=run, name='session-sweeper', daemon=True)
+    thread.start()
+    return thread
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.previous_sid = None
+
+    def regenerate(self):
+        """Move the session to a fresh id (call on login to prevent session fixation)."""
+        self.previous_sid = self.previous_sid or self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+
+
+class ServerSideSessionInterface(SessionInterface):
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data = self.store.get(sid)
+            if data is not None:
+                return ServerSideSession(data, sid=sid)
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.previous_sid:
+            self.store.delete(session.previous_sid)
+        if not session:
+            if not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if not session.modified:
+            return
+
+        self.store.set(session.sid, dict(session))
+        response.vary.add('Cookie')
+        # A browser-session cookie: expiry is enforced by the store
+        response.set_cookie(
+            name, session.sid,
+            httponly=self.get_cookie_httponly(app),
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+            domain=domain,
+            path=path,
+        )
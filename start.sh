@@ -11,16 +11,14 @@ fi
 
 # Check dependencies
 echo "📦 Checking dependencies..."
-python3 -c "import flask, flask_cors" 2>/dev/null
+python3 -c "import flask, flask_cors, uvicorn, PIL, brotli" 2>/dev/null
 if [ $? -ne 0 ]; then
     echo "📦 Installing dependencies..."
-    pip3 install flask flask-cors
+    # Pillow and brotli build the resized/WebP product images and .br assets;
+    # without them the app still runs, serving originals and gzip only
+    pip3 install flask flask-cors uvicorn pillow brotli
 fi
 
-# Initialize database
-echo "🗄️  Initializing database..."
-python3 -c "from database import DatabaseManager; DatabaseManager()"
-
 echo "✅ System ready!"
 echo ""
 echo "🌐 Starting web server..."
@@ -32,5 +30,6 @@ echo ""
 echo "Press Ctrl+C to stop the server"
 echo "=================================="
 
-# Start Flask application
-python3 app.py
+# Start the ASGI server (set WEB_CONCURRENCY to change the worker count;
+# `python3 app.py` still runs the Flask development server)
+exec python3 serve.py --port 5050
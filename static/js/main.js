@@ -179,7 +179,7 @@ function createProductCard(product) {
     const imgSrc = imageMap[product.name] || '/picture/default.jpg';
     
     card.innerHTML = `
-        <img class="product-image" src="${imgSrc}" alt="${product.name}" />
+        ${productImageHtml(imgSrc, product.name)}
         <h3>${product.name}</h3>
         <div class="category">${product.category}</div>
         <div class="price">$${product.price.toFixed(2)}</div>
@@ -195,6 +195,23 @@ function createProductCard(product) {
     return card;
 }
 
+// 使用构建后的图片 (带哈希的缩放版本 + WebP), 没有构建结果时退回原图
+function productImageHtml(imgSrc, alt) {
+    const built = (window.ASSET_IMAGES || {})[imgSrc.split('/').pop().toLowerCase()];
+    if (!built) {
+        return `<img class="product-image" src="${imgSrc}" alt="${alt}" loading="lazy" />`;
+    }
+    if (!built.srcset) {
+        return `<img class="product-image" src="${built.src}" alt="${alt}" loading="lazy" />`;
+    }
+    const sizes = '(max-width: 640px) 100vw, 320px';
+    return `
+        <picture>
+            <source type="image/webp" srcset="${built.webp_srcset}" sizes="${sizes}">
+            <img class="product-image" src="${built.src}" srcset="${built.srcset}" sizes="${sizes}" alt="${alt}" loading="lazy" />
+        </picture>`;
+}
+
 // 将产品名转为图片文件名（小写、去空格和特殊字符）
 /*function slugifyProductName(name) {
     return String(name)
@@ -413,8 +430,21 @@ function renderOrderHistory(orders) {
     container.appendChild(table);
 }
 
+// Line items of orders listed with include=items, so Details needs no request
+const orderItemsCache = new Map();
+
+function cacheOrderItems(orders) {
+    orders.forEach(order => {
+        if (order.items) orderItemsCache.set(order.order_id, order.items);
+    });
+}
+
 // 查看订单详情
 async function viewOrderDetails(orderId) {
+    if (orderItemsCache.has(orderId)) {
+        showOrderDetailsModal(orderId, orderItemsCache.get(orderId));
+        return;
+    }
     try {
         const response = await fetch(`/api/orders/${orderId}/details`);
         const result = await response.json();
@@ -507,7 +537,8 @@ function showOrderDetailsModal(orderId, items) {
 function getStatusText(status) {
     const statusMap = {
         'pending': 'Pending',
-        'processing': 'Processing',
+        'preparing': 'Preparing',
+        'ready': 'Ready',
         'completed': 'Completed',
         'cancelled': 'Cancelled'
     };
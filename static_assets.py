@@ -0,0 +1,204 @@
+"""
+Static asset pipeline for the Coffee Ordering System
+
+StaticAssets.build() copies the stylesheets, scripts and product pictures
+under static/ into an output directory (static/dist by default) with a
+content hash in every file name, e.g. css/style.3f2a9c1b0d.css, and writes a
+manifest.json mapping the original names to the hashed ones:
+
+- CSS/JS get .gz (and .br when the brotli package is installed) siblings,
+  so they are compressed once at build time instead of on every request
+- product pictures get resized JPEG and WebP variants per width in
+  IMAGE_WIDTHS when Pillow is installed; without it the original is copied
+
+Hashed files never change, so app.py serves them from /assets/ with a
+one-year immutable Cache-Control, picking the .br/.gz sibling that the
+request's Accept-Encoding allows. The build is skipped for files whose
+hashed output already exists, so running it on every startup is cheap.
+Every file is written to a temporary file of its own and renamed into
+place, so processes building into the same directory at once never see or
+clobber each other's partial output.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json')
+IMAGES = ('.jpg', '.jpeg', '.png')
+
+# Rendered widths of the product card image, at 1x and 2x
+IMAGE_WIDTHS = (320, 640)
+JPEG_QUALITY = 80
+WEBP_QUALITY = 75
+
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def _content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def _hashed_name(name, digest, suffix='', ext=None):
+    stem, original_ext = os.path.splitext(name)
+    return f"{stem}.{digest}{suffix}{original_ext if ext is None else ext}"
+
+
+@contextmanager
+def _replacing(path):
+    """Open a uniquely named temporary file next to path; it replaces path when the block succeeds."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    f = tempfile.NamedTemporaryFile(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp',
+                                    delete=False)
+    try:
+        with f:
+            yield f
+        os.replace(f.name, path)
+    except BaseException:
+        os.unlink(f.name)
+        raise
+
+
+def _write(path, data):
+    with _replacing(path) as f:
+        f.write(data)
+
+
+class StaticAssets:
+    def __init__(self, static_dir, output_dir=None, sources=('css', 'js', 'picture')):
+        self.static_dir = static_dir
+        self.output_dir = output_dir or os.path.join(static_dir, 'dist')
+        self.sources = sources
+        self.manifest = {}
+
+    def build(self):
+        """Write hashed, compressed and resized copies of every asset; returns the manifest."""
+        manifest = {}
+        for source in self.sources:
+            root = os.path.join(self.static_dir, source)
+            if not os.path.isdir(root):
+                continue
+            for dirpath, _, filenames in os.walk(root):
+                for filename in sorted(filenames):
+                    path = os.path.join(dirpath, filename)
+                    name = os.path.relpath(path, self.static_dir).replace(os.sep, '/')
+                    ext = os.path.splitext(filename)[1].lower()
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                    if ext in IMAGES:
+                        manifest[name] = self._build_image(name, data)
+                    else:
+                        manifest[name] = self._build_file(name, data, compress=ext in COMPRESSIBLE)
+
+        _write(os.path.join(self.output_dir, 'manifest.json'), json.dumps(manifest, indent=1).encode())
+        self.manifest = manifest
+        return manifest
+
+    def load(self):
+        """Use the manifest of an earlier build (e.g. from `manage.py build-assets`)."""
+        try:
+            with open(os.path.join(self.output_dir, 'manifest.json')) as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+        return self.manifest
+
+    def _build_file(self, name, data, compress):
+        hashed = _hashed_name(name, _content_hash(data))
+        target = os.path.join(self.output_dir, hashed)
+        if not os.path.exists(target):
+            if compress:
+                _write(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    _write(target + '.br', brotli.compress(data, mode=brotli.MODE_TEXT))
+            _write(target, data)
+        return {'file': hashed}
+
+    def _build_image(self, name, data):
+        digest = _content_hash(data)
+        entry = {'file': _hashed_name(name, digest), 'variants': {}}
+        target = os.path.join(self.output_dir, entry['file'])
+        if not os.path.exists(target):
+            _write(target, data)
+        if Image is None:
+            return entry
+
+        source = None
+        for width in IMAGE_WIDTHS:
+            variant = {
+                'jpeg': _hashed_name(name, digest, f'.w{width}', '.jpg'),
+                'webp': _hashed_name(name, digest, f'.w{width}', '.webp'),
+            }
+            entry['variants'][str(width)] = variant
+            if all(os.path.exists(os.path.join(self.output_dir, path)) for path in variant.values()):
+                continue
+            if source is None:
+                source = Image.open(os.path.join(self.static_dir, name)).convert('RGB')
+            image = source
+            if source.width > width:
+                image = source.resize((width, round(source.height * width / source.width)), Image.LANCZOS)
+            for fmt, path in variant.items():
+                with _replacing(os.path.join(self.output_dir, path)) as f:
+                    if fmt == 'jpeg':
+                        image.save(f, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+                    else:
+                        image.save(f, 'WEBP', quality=WEBP_QUALITY, method=6)
+        return entry
+
+    def url(self, name, prefix='/assets/'):
+        """Hashed URL for a static file name such as 'css/style.css', or None if it was not built."""
+        entry = self.manifest.get(name)
+        return prefix + entry['file'] if entry else None
+
+    def images(self, source='picture', prefix='/assets/'):
+        """Lower-cased picture file name -> {'src', 'srcset', 'webp_srcset'} for the menu script.
+
+        Keys are lower-cased because the menu refers to pictures with
+        inconsistent capitalization.
+        """
+        images = {}
+        for name, entry in self.manifest.items():
+            directory, _, filename = name.rpartition('/')
+            if directory != source or 'variants' not in entry:
+                continue
+            variants = entry['variants']
+            if not variants:
+                images[filename.lower()] = {'src': prefix + entry['file'], 'srcset': None, 'webp_srcset': None}
+                continue
+            widths = sorted(variants, key=int)
+            images[filename.lower()] = {
+                'src': prefix + variants[widths[0]]['jpeg'],
+                'srcset': ', '.join(f"{prefix}{variants[w]['jpeg']} {w}w" for w in widths),
+                'webp_srcset': ', '.join(f"{prefix}{variants[w]['webp']} {w}w" for w in widths),
+            }
+        return images
+
+    def resolve(self, path, accept_encoding=()):
+        """(file_path, content_encoding) for a hashed path under output_dir, or (None, None).
+
+        accept_encoding is the set of encodings the client accepts; the
+        smallest precompressed sibling it allows is chosen.
+        """
+        root = os.path.abspath(self.output_dir)
+        full = os.path.abspath(os.path.join(root, path))
+        if not full.startswith(root + os.sep) or path == 'manifest.json' or not os.path.isfile(full):
+            return None, None
+        for encoding, suffix in ENCODINGS:
+            if encoding in accept_encoding and os.path.isfile(full + suffix):
+                return full + suffix, encoding
+        return full, None